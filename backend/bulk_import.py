@@ -0,0 +1,87 @@
+"""
+Parsing helpers for bulk found-item imports.
+
+Partner venues upload a CSV or NDJSON file with one found item per row and,
+optionally, a zip archive with the images referenced by the rows' ``image``
+column.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import mimetypes
+import zipfile
+from typing import Dict, List, Tuple
+
+IMPORT_FIELDS = (
+    'title', 'category', 'description', 'location', 'date',
+    'owner_name', 'owner_email', 'owner_phone',
+)
+MAX_IMPORT_ROWS = 2000
+MAX_ARCHIVE_BYTES = 200 * 1024 * 1024
+
+
+def parse_import_file(content: bytes, filename: str) -> List[Tuple[int, dict]]:
+    """Parse a CSV or NDJSON import into numbered rows"""
+    text = content.decode('utf-8-sig')
+    if filename.lower().endswith(('.ndjson', '.jsonl')):
+        rows = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {number}: {e.msg}")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {number} is not a JSON object")
+            rows.append((number, row))
+    elif filename.lower().endswith('.csv'):
+        # Row 1 is the header
+        rows = list(enumerate(csv.DictReader(io.StringIO(text)), start=2))
+    else:
+        raise ValueError("Import file must be .csv or .ndjson")
+
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f"Import is limited to {MAX_IMPORT_ROWS} rows")
+    return rows
+
+
+def clean_row(row: dict) -> dict:
+    """Keep known fields and turn empty values into None"""
+    cleaned = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        cleaned[field] = value if value not in ('', None) else None
+    return cleaned
+
+
+def read_image_archive(content: bytes) -> Dict[str, bytes]:
+    """Read the images of a zip archive keyed by file name"""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        raise ValueError("Image archive must be a zip file")
+
+    images = {}
+    total = 0
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        total += info.file_size
+        if total > MAX_ARCHIVE_BYTES:
+            raise ValueError("Image archive is too large")
+        name = info.filename.rsplit('/', 1)[-1]
+        images[name] = archive.read(info)
+    return images
+
+
+def image_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def guess_content_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
@@ -0,0 +1,210 @@
+"""
+WebSocket push for RentEase chat.
+
+Clients connect to the chat WebSocket, join the conversations they have open
+and receive each new message as it is created, instead of polling
+``GET /api/messages``. Events are published through a pluggable pub/sub
+backend so a message created on one worker reaches clients connected to any
+worker:
+
+- ``memory`` (default) delivers within the current process, which is all a
+  single worker needs.
+- ``broker`` connects every worker to a small line-delimited JSON broker
+  over TCP, a local stand-in for a shared pub/sub service. Start it with
+
+      python chat_realtime.py broker --port 8765
+
+  and set ``CHAT_PUBSUB=broker`` and ``CHAT_BROKER_URL=tcp://127.0.0.1:8765``.
+
+Another backend only needs ``start``, ``stop`` and ``publish`` and to call
+the handler it was given for every event on every worker.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import urlparse
+
+from starlette.websockets import WebSocket
+
+CHAT_PUBSUB = os.environ.get("CHAT_PUBSUB", "memory")
+CHAT_BROKER_URL = os.environ.get("CHAT_BROKER_URL", "tcp://127.0.0.1:8765")
+SEND_TIMEOUT_SECONDS = 5.0
+BROKER_RECONNECT_SECONDS = 2.0
+
+EventHandler = Callable[[str, dict], Awaitable[None]]
+
+
+class ConnectionHub:
+    """WebSockets on this worker, grouped into per-conversation rooms"""
+
+    def __init__(self):
+        self.rooms: Dict[str, Set[WebSocket]] = {}
+
+    def join(self, conversation_id: str, websocket: WebSocket):
+        self.rooms.setdefault(conversation_id, set()).add(websocket)
+
+    def leave(self, conversation_id: str, websocket: WebSocket):
+        room = self.rooms.get(conversation_id)
+        if room is None:
+            return
+        room.discard(websocket)
+        if not room:
+            del self.rooms[conversation_id]
+
+    def disconnect(self, websocket: WebSocket):
+        for conversation_id in list(self.rooms):
+            self.leave(conversation_id, websocket)
+
+    async def _send(self, websocket: WebSocket, event: dict) -> bool:
+        try:
+            await asyncio.wait_for(websocket.send_json(event), timeout=SEND_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def deliver(self, conversation_id: str, event: dict):
+        sockets = list(self.rooms.get(conversation_id, ()))
+        if not sockets:
+            return
+        results = await asyncio.gather(*(self._send(ws, event) for ws in sockets))
+        # Drop clients that could not keep up or have gone away
+        for websocket, delivered in zip(sockets, results):
+            if not delivered:
+                self.disconnect(websocket)
+
+
+class InProcessPubSub:
+    """Delivers events to subscribers in this process only"""
+
+    def __init__(self):
+        self.handler: Optional[EventHandler] = None
+
+    async def start(self, handler: EventHandler):
+        self.handler = handler
+
+    async def stop(self):
+        self.handler = None
+
+    async def publish(self, channel: str, event: dict):
+        if self.handler is not None:
+            await self.handler(channel, event)
+
+
+class BrokerPubSub:
+    """Relays events through a TCP broker shared by all workers"""
+
+    def __init__(self, url: str = CHAT_BROKER_URL):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 8765
+        self.handler: Optional[EventHandler] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: EventHandler):
+        self.handler = handler
+        self._reader_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        self._close_writer()
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                logging.info(f"Connected to chat broker at {self.host}:{self.port}")
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    envelope = json.loads(line)
+                    await self.handler(envelope["channel"], envelope["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Chat broker connection failed: {str(e)}")
+            self._close_writer()
+            await asyncio.sleep(BROKER_RECONNECT_SECONDS)
+
+    async def publish(self, channel: str, event: dict):
+        if self._writer is None:
+            # Without the broker, at least reach clients on this worker
+            logging.warning("Chat broker unavailable, delivering locally only")
+            await self.handler(channel, event)
+            return
+        line = json.dumps({"channel": channel, "event": event}, separators=(",", ":"))
+        self._writer.write(line.encode("utf-8") + b"\n")
+        await self._writer.drain()
+
+
+def create_pubsub(kind: str = CHAT_PUBSUB):
+    if kind == "memory":
+        return InProcessPubSub()
+    if kind == "broker":
+        return BrokerPubSub()
+    raise ValueError(f"Unknown CHAT_PUBSUB backend: {kind}")
+
+
+class ChatRealtime:
+    """Publishes chat events and delivers them to this worker's rooms"""
+
+    def __init__(self, pubsub=None):
+        self.hub = ConnectionHub()
+        self.pubsub = pubsub or create_pubsub()
+
+    async def start(self):
+        await self.pubsub.start(self.hub.deliver)
+
+    async def stop(self):
+        await self.pubsub.stop()
+
+    async def publish(self, conversation_id: str, event: dict):
+        await self.pubsub.publish(conversation_id, event)
+
+
+async def run_broker(host: str = "127.0.0.1", port: int = 8765):
+    """Fan every line received from one worker out to all connected workers"""
+    writers: Set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(writers):
+                    try:
+                        peer.write(line)
+                    except Exception:
+                        writers.discard(peer)
+                await asyncio.gather(*(peer.drain() for peer in list(writers)), return_exceptions=True)
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Chat broker listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["broker"]:
+    port = int(sys.argv[sys.argv.index("--port") + 1]) if "--port" in sys.argv else 8765
+    asyncio.run(run_broker(port=port))
@@ -0,0 +1,65 @@
+"""
+Conditional GET support for RentEase reads.
+
+Every listing carries a ``version`` counter. Writes to the listing, and to
+its reviews, increment it in the same update that changes the data. Read
+endpoints derive a strong ETag from the versions a response was built from
+and the request's query parameters. A client that sends the ETag back in
+``If-None-Match`` gets an empty 304 until something it saw has changed.
+
+Listings written before the counter existed read as version 0 until their
+next write.
+"""
+
+import hashlib
+import json
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+VERSION_FIELD = "version"
+VERSION_PROJECTION = {VERSION_FIELD: 1}
+
+# Clients may keep the body but must revalidate it before every use
+CACHE_CONTROL = "no-cache"
+
+
+def version_of(doc: Optional[dict]) -> int:
+    return (doc or {}).get(VERSION_FIELD, 0)
+
+
+def with_version_bump(update: Optional[dict] = None) -> dict:
+    """Copy of a Mongo update document that also increments the version"""
+    update = dict(update or {})
+    update["$inc"] = {**update.get("$inc", {}), VERSION_FIELD: 1}
+    return update
+
+
+def make_etag(kind: str, *parts) -> str:
+    data = json.dumps([kind, *parts], separators=(",", ":"), default=str).encode("utf-8")
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def query_key(request: Request) -> list:
+    """Query parameters in a stable order, so equivalent URLs share an ETag"""
+    return sorted(request.query_params.multi_items())
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
@@ -0,0 +1,54 @@
+"""
+Fast JSON responses for Mongo documents.
+
+``serialize_doc`` copies every document key by key and FastAPI's
+``jsonable_encoder`` then walks the result again. Read endpoints instead
+rename ``_id`` to ``id`` in place with ``public_doc`` and return a
+``MongoJSONResponse``, which hands the documents straight to orjson:
+``datetime`` is encoded natively and ``ObjectId`` through a default hook, so
+each document is visited once, by C code. Returning a response object also
+bypasses ``jsonable_encoder``.
+
+Without orjson installed the response falls back to the standard library
+encoder with the same hook.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Optional
+
+from bson import ObjectId
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def public_doc(doc: Optional[dict]) -> Optional[dict]:
+    """Expose a Mongo document's ``_id`` as ``id``, in place"""
+    if doc is not None and "_id" in doc:
+        doc["id"] = doc.pop("_id")
+    return doc
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response that encodes ObjectId and datetime values directly"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,11 +1,20 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
 import os
+import hashlib
+import hmac
+import itertools
+import mimetypes
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 from unittest.mock import MagicMock
 
 load_dotenv()
 
+# Firestore allows at most 500 writes per batch
+FIRESTORE_BATCH_SIZE = 400
+
 # Mock storage for development
 class MockFirestore:
     def __init__(self):
@@ -13,65 +22,226 @@ class MockFirestore:
     
     def collection(self, name):
         return MockCollection(name, self._data)
+    
+    def batch(self):
+        return MockWriteBatch()
+    
+    def write_option(self, last_update_time=None):
+        return MockWriteOption(last_update_time)
 
-class MockCollection:
-    def __init__(self, name, data):
+class MockWriteOption:
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+# Stands in for document update times; increases on every write
+_mock_clock = itertools.count(1)
+
+def _update_times(data, name):
+    return data.setdefault(f"{name}:update_times", {})
+
+_MOCK_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: b in (a or []),
+}
+
+class MockQuery:
+    def __init__(self, name, data, filters=None, limit=None):
         self.name = name
         self._data = data
-        if name not in self._data:
-            self._data[name] = {}
-    
-    def document(self, doc_id):
-        return MockDocument(self.name, doc_id, self._data[self.name])
+        self._filters = filters or []
+        self._limit = limit
     
     def where(self, field, op, value):
-        return self
+        return MockQuery(self.name, self._data, self._filters + [(field, op, value)], self._limit)
+    
+    def limit(self, count):
+        return MockQuery(self.name, self._data, self._filters, count)
     
     def stream(self):
-        return [MockDocSnapshot(doc_id, data) for doc_id, data in self._data[self.name].items()]
+        results = []
+        for doc_id, data in list(self._data[self.name].items()):
+            if all(_MOCK_OPERATORS[op](data.get(field), value) for field, op, value in self._filters):
+                results.append(MockDocSnapshot(doc_id, data, _update_times(self._data, self.name).get(doc_id)))
+                if self._limit is not None and len(results) >= self._limit:
+                    break
+        return results
+
+class MockCollection(MockQuery):
+    def __init__(self, name, data):
+        super().__init__(name, data)
+        if name not in self._data:
+            self._data[name] = {}
+    
+    def document(self, doc_id):
+        return MockDocument(self.name, doc_id, self._data[self.name], _update_times(self._data, self.name))
 
 class MockDocument:
-    def __init__(self, collection, doc_id, data):
+    def __init__(self, collection, doc_id, data, update_times):
         self.collection = collection
         self.doc_id = doc_id
         self._data = data
+        self._update_times = update_times
     
     def set(self, data):
         self._data[self.doc_id] = data
+        self._update_times[self.doc_id] = next(_mock_clock)
+    
+    def _check_precondition(self, option):
+        if option is not None and option.last_update_time != self._update_times.get(self.doc_id):
+            # Same error the Firestore client raises for a failed precondition
+            from google.api_core.exceptions import FailedPrecondition
+            raise FailedPrecondition(f"Document changed: {self.collection}/{self.doc_id}")
+    
+    def update(self, data, option=None):
+        if self.doc_id not in self._data:
+            raise KeyError(f"No document to update: {self.collection}/{self.doc_id}")
+        self._check_precondition(option)
+        self._data[self.doc_id] = {**self._data[self.doc_id], **data}
+        self._update_times[self.doc_id] = next(_mock_clock)
     
     def get(self):
-        return MockDocSnapshot(self.doc_id, self._data.get(self.doc_id))
+        return MockDocSnapshot(self.doc_id, self._data.get(self.doc_id), self._update_times.get(self.doc_id))
     
-    def delete(self):
+    def delete(self, option=None):
+        self._check_precondition(option)
         if self.doc_id in self._data:
             del self._data[self.doc_id]
+            self._update_times.pop(self.doc_id, None)
 
 class MockDocSnapshot:
-    def __init__(self, doc_id, data):
+    def __init__(self, doc_id, data, update_time=None):
         self.id = doc_id
         self._data = data
         self.exists = data is not None
+        self.update_time = update_time
     
     def to_dict(self):
         return self._data
 
+class MockWriteBatch:
+    def __init__(self):
+        self._ops = []
+    
+    def set(self, ref, data):
+        self._ops.append(lambda: ref.set(data))
+    
+    def update(self, ref, data):
+        self._ops.append(lambda: ref.update(data))
+    
+    def delete(self, ref):
+        self._ops.append(ref.delete)
+    
+    def commit(self):
+        for op in self._ops:
+            op()
+        self._ops = []
+
+# Local filesystem storage for development. Signed URLs point at the API's
+# /api/storage/local routes, which check the signature and read or write the file.
+LOCAL_STORAGE_DIR = Path(os.environ.get('LOCAL_STORAGE_DIR', Path(__file__).parent / 'local_storage'))
+LOCAL_STORAGE_BASE_URL = os.environ.get('LOCAL_STORAGE_BASE_URL', 'http://localhost:8001/api/storage/local')
+LOCAL_STORAGE_SECRET = os.environ.get('LOCAL_STORAGE_SECRET', 'local-storage-dev-secret')
+
+def sign_local_url(path, method, expires, content_type=''):
+    message = f"{method}\n{path}\n{expires}\n{content_type}".encode('utf-8')
+    return hmac.new(LOCAL_STORAGE_SECRET.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def verify_local_url(path, method, expires, signature, content_type=''):
+    if int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sign_local_url(path, method, expires, content_type), signature)
+
 class MockStorageBucket:
+    def __init__(self, root=None):
+        self.root = Path(root or LOCAL_STORAGE_DIR).resolve()
+    
+    def _file_path(self, path):
+        file_path = (self.root / path).resolve()
+        if self.root not in file_path.parents:
+            raise ValueError(f"Invalid blob path: {path}")
+        return file_path
+    
     def blob(self, path):
-        return MockBlob(path)
+        return MockBlob(path, self)
+    
+    def list_blobs(self, prefix=None):
+        if not self.root.exists():
+            return []
+        blobs = []
+        for file_path in self.root.rglob('*'):
+            path = file_path.relative_to(self.root).as_posix()
+            if file_path.is_file() and (not prefix or path.startswith(prefix)):
+                blobs.append(MockBlob(path, self))
+        return blobs
+    
+    def delete_blobs(self, blobs, on_error=None):
+        for blob in blobs:
+            blob.delete()
+    
+    def copy_blob(self, blob, destination_bucket, new_name):
+        new_blob = destination_bucket.blob(new_name)
+        new_blob.upload_from_string(blob.download_as_bytes(), content_type=blob.content_type)
+        return new_blob
 
 class MockBlob:
-    def __init__(self, path):
+    def __init__(self, path, bucket):
         self.path = path
-        self.public_url = f"https://storage.mock/items/{path}"
+        self.name = path
+        self._bucket = bucket
+        self._file = bucket._file_path(path)
+        self.public_url = f"{LOCAL_STORAGE_BASE_URL}/{path}"
+        self.content_type = mimetypes.guess_type(path)[0]
     
-    def upload_from_string(self, content, content_type=None):
+    @property
+    def size(self):
+        return self._file.stat().st_size if self._file.exists() else None
+    
+    @property
+    def time_created(self):
+        if not self._file.exists():
+            return None
+        return datetime.fromtimestamp(self._file.stat().st_mtime, tz=timezone.utc)
+    
+    def exists(self):
+        return self._file.is_file()
+    
+    def reload(self):
         pass
     
+    def upload_from_string(self, content, content_type=None):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        self._file.parent.mkdir(parents=True, exist_ok=True)
+        self._file.write_bytes(content)
+    
+    def download_as_bytes(self):
+        return self._file.read_bytes()
+    
     def make_public(self):
         pass
+    
+    def delete(self):
+        if self._file.exists():
+            self._file.unlink()
+    
+    def generate_signed_url(self, expiration, method='GET', content_type=None, version='v4', headers=None):
+        expires = int(time.time() + expiration.total_seconds())
+        signature = sign_local_url(self.path, method, expires, content_type or '')
+        query = urlencode({'expires': expires, 'signature': signature})
+        return f"{LOCAL_STORAGE_BASE_URL}/{self.path}?{query}"
 
 # Initialize Firebase Admin SDK
+# The SDK is imported here rather than at module level because it is slow to load
 def initialize_firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+    
     if not firebase_admin._apps:
         try:
             # Try to initialize with credentials if available
@@ -94,10 +264,12 @@ def get_firestore_client():
     is_mock = initialize_firebase()
     if is_mock:
         return MockFirestore()
+    from firebase_admin import firestore
     return firestore.client()
 
 def get_storage_bucket():
     is_mock = initialize_firebase()
     if is_mock:
         return MockStorageBucket()
+    from firebase_admin import storage
     return storage.bucket()
\ No newline at end of file
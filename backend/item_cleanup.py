@@ -0,0 +1,166 @@
+"""
+Cascade cleanup for deleted Lost & Found items.
+
+The delete handler only removes the item document and enqueues the item id
+here. A background worker then removes the item's Storage blobs under
+``items/{item_id}/`` and its ``matches`` rows in batches, off the request
+path. A periodic sweeper catches anything left behind:
+
+- matches and ``items/`` blobs that point at items which no longer exist;
+- uploads under ``uploads/`` that no item is still waiting on once they expire.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from firebase_config import FIRESTORE_BATCH_SIZE
+from upload_sessions import UPLOAD_PREFIX, UPLOAD_SESSION_TTL_SECONDS
+
+CLEANUP_SWEEP_INTERVAL_SECONDS = int(os.environ.get('ITEM_CLEANUP_SWEEP_INTERVAL_SECONDS', '21600'))
+
+# An upload can be claimed until its signed URL expires; the grace period
+# covers items submitted right at the end of a session
+UPLOAD_RETENTION_SECONDS = int(os.environ.get('UPLOAD_RETENTION_SECONDS', str(UPLOAD_SESSION_TTL_SECONDS + 3600)))
+
+# Storage allows at most 100 deletes per call
+BLOB_BATCH_SIZE = 100
+
+
+def _chunks(values: List, size: int) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class ItemCleanupPipeline:
+    """Queue and background worker that cascade item deletions"""
+
+    def __init__(
+        self,
+        db,
+        bucket,
+        upload_prefix: str = UPLOAD_PREFIX,
+        upload_retention: int = UPLOAD_RETENTION_SECONDS,
+    ):
+        self.db = db
+        self.bucket = bucket
+        self.upload_prefix = upload_prefix
+        self.upload_retention = upload_retention
+        self._queue: Optional[asyncio.Queue] = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def enqueue(self, item_id: str):
+        """Schedule cleanup of a deleted item"""
+        self.queue.put_nowait(item_id)
+
+    def _delete_blobs(self, blobs: List) -> int:
+        for chunk in _chunks(blobs, BLOB_BATCH_SIZE):
+            self.bucket.delete_blobs(chunk, on_error=lambda blob: None)
+        return len(blobs)
+
+    def _delete_matches(self, match_ids: List[str]) -> int:
+        matches = self.db.collection('matches')
+        for chunk in _chunks(match_ids, FIRESTORE_BATCH_SIZE):
+            batch = self.db.batch()
+            for match_id in chunk:
+                batch.delete(matches.document(match_id))
+            batch.commit()
+        return len(match_ids)
+
+    def cleanup_item(self, item_id: str) -> dict:
+        """Remove the blobs and matches that belong to a deleted item"""
+        blobs = list(self.bucket.list_blobs(prefix=f"items/{item_id}/"))
+
+        matches = self.db.collection('matches')
+        match_ids = set()
+        for field in ('lost_item_id', 'found_item_id'):
+            match_ids.update(doc.id for doc in matches.where(field, '==', item_id).stream())
+
+        return {
+            'item_id': item_id,
+            'blobs_deleted': self._delete_blobs(blobs),
+            'matches_deleted': self._delete_matches(sorted(match_ids)),
+        }
+
+    def _is_referenced(self, field: str, value: str, **filters) -> bool:
+        query = self.db.collection('items').where(field, '==', value)
+        for other_field, other_value in filters.items():
+            query = query.where(other_field, '==', other_value)
+        return any(True for _ in query.limit(1).stream())
+
+    def _expired_uploads(self, now: datetime) -> List:
+        """Uploads past their retention that no item is still waiting to process"""
+        cutoff = now - timedelta(seconds=self.upload_retention)
+        expired = []
+        for blob in self.bucket.list_blobs(prefix=self.upload_prefix):
+            created = blob.time_created
+            if created is None or created > cutoff:
+                continue
+            if not self._is_referenced('image_key', blob.name, image_status='processing'):
+                expired.append(blob)
+        return expired
+
+    def sweep(self, now: Optional[datetime] = None) -> dict:
+        """Remove orphaned matches and blobs, and expired uploads"""
+        now = now or datetime.now(timezone.utc)
+        items = self.db.collection('items')
+        known = {}
+
+        def item_exists(item_id: str) -> bool:
+            if item_id not in known:
+                known[item_id] = items.document(item_id).get().exists
+            return known[item_id]
+
+        orphan_matches = []
+        for doc in self.db.collection('matches').stream():
+            match = doc.to_dict()
+            if not item_exists(match['lost_item_id']) or not item_exists(match['found_item_id']):
+                orphan_matches.append(doc.id)
+
+        orphan_blobs = []
+        for blob in self.bucket.list_blobs(prefix="items/"):
+            parts = blob.name.split('/')
+            if len(parts) > 2 and not item_exists(parts[1]):
+                orphan_blobs.append(blob)
+
+        report = {
+            'blobs_deleted': self._delete_blobs(orphan_blobs),
+            'matches_deleted': self._delete_matches(orphan_matches),
+            'uploads_deleted': self._delete_blobs(self._expired_uploads(now)),
+        }
+        logging.info(
+            f"Item cleanup sweep removed {report['matches_deleted']} orphan matches, "
+            f"{report['blobs_deleted']} orphan blobs and {report['uploads_deleted']} expired uploads"
+        )
+        return report
+
+    async def run_worker(self):
+        """Process queued deletions until cancelled"""
+        while True:
+            item_id = await self.queue.get()
+            try:
+                report = await asyncio.to_thread(self.cleanup_item, item_id)
+                logging.info(
+                    f"Cleaned up item {item_id}: {report['blobs_deleted']} blobs, "
+                    f"{report['matches_deleted']} matches"
+                )
+            except Exception as e:
+                logging.error(f"Error cleaning up item {item_id}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def run_sweeper(self, interval: int = CLEANUP_SWEEP_INTERVAL_SECONDS):
+        """Sweep for orphans on a fixed interval until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logging.error(f"Item cleanup sweep failed: {str(e)}")
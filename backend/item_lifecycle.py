@@ -0,0 +1,130 @@
+"""
+Lifecycle management for Lost & Found items.
+
+Active items older than a configurable age, and items that are part of a
+confirmed match, are moved to the ``archived`` status in batches. Archived
+items stay in the ``items`` collection so they remain fetchable by id, but
+they drop out of every query that filters on ``status == 'active'``.
+
+Confirmed matches are read only until their items have been archived: each
+match is flagged ``archived`` in the same batch that archives its items, so
+every run only reads the confirmations made since the previous one.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from firebase_config import FIRESTORE_BATCH_SIZE
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ITEM_ARCHIVE_AFTER_DAYS', '90'))
+LIFECYCLE_INTERVAL_SECONDS = int(os.environ.get('ITEM_LIFECYCLE_INTERVAL_SECONDS', '3600'))
+
+
+class ItemLifecycleManager:
+    """Archives stale and matched items out of the active set"""
+
+    def __init__(self, db, archive_after_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = FIRESTORE_BATCH_SIZE):
+        self.db = db
+        self.archive_after_days = archive_after_days
+        self.batch_size = batch_size
+        self.last_report: Optional[dict] = None
+
+    def _stale_item_ids(self, now: datetime) -> List[str]:
+        cutoff = (now - timedelta(days=self.archive_after_days)).isoformat()
+        docs = (
+            self.db.collection('items')
+            .where('status', '==', 'active')
+            .where('created_at', '<', cutoff)
+            .stream()
+        )
+        return [doc.id for doc in docs]
+
+    def _archive_item(self, batch, item_id: str, reason: str, now: datetime) -> bool:
+        """Add the archival of a still-active item to a batch"""
+        ref = self.db.collection('items').document(item_id)
+        snapshot = ref.get()
+        if not snapshot.exists or snapshot.to_dict().get('status') != 'active':
+            return False
+        batch.update(ref, {
+            'status': 'archived',
+            'archived_at': now.isoformat(),
+            'archive_reason': reason,
+        })
+        return True
+
+    def _archive_matched(self, now: datetime) -> List[str]:
+        """Archive the items of unprocessed confirmed matches and flag those matches"""
+        matches = self.db.collection('matches')
+        pending_matches = matches.where('confirmed', '==', True).where('archived', '==', False).stream()
+        archived = []
+        batch = self.db.batch()
+        pending = 0
+        for doc in pending_matches:
+            match = doc.to_dict()
+            for item_id in (match['lost_item_id'], match['found_item_id']):
+                if item_id not in archived and self._archive_item(batch, item_id, 'matched', now):
+                    archived.append(item_id)
+                    pending += 1
+            batch.update(matches.document(doc.id), {'archived': True})
+            pending += 1
+            # A match and its items always share a batch
+            if pending >= self.batch_size:
+                batch.commit()
+                batch = self.db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+        return archived
+
+    def _archive(self, item_ids: List[str], reason: str, now: datetime) -> List[str]:
+        """Archive still-active items in batched writes and return their ids"""
+        archived = []
+        batch = self.db.batch()
+        pending = 0
+        for item_id in item_ids:
+            if not self._archive_item(batch, item_id, reason, now):
+                continue
+            archived.append(item_id)
+            pending += 1
+            if pending >= self.batch_size:
+                batch.commit()
+                batch = self.db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+        return archived
+
+    def run_once(self) -> dict:
+        """Run one archival pass and return a report of what was archived"""
+        now = datetime.now(timezone.utc)
+        matched = self._archive_matched(now)
+        stale = self._archive(self._stale_item_ids(now), 'stale', now)
+
+        report = {
+            'ran_at': now.isoformat(),
+            'archived': len(matched) + len(stale),
+            'archived_matched': len(matched),
+            'archived_stale': len(stale),
+            'archived_ids': matched + stale,
+        }
+        self.last_report = report
+        logging.info(
+            f"Item lifecycle run archived {report['archived']} items "
+            f"({len(matched)} matched, {len(stale)} stale)"
+        )
+        return report
+
+    async def run_forever(self, interval: int = LIFECYCLE_INTERVAL_SECONDS,
+                          on_report: Optional[Callable[[dict], None]] = None):
+        """Run archival passes on a fixed interval until cancelled"""
+        while True:
+            try:
+                report = await asyncio.to_thread(self.run_once)
+                if on_report:
+                    on_report(report)
+            except Exception as e:
+                logging.error(f"Item lifecycle run failed: {str(e)}")
+            await asyncio.sleep(interval)
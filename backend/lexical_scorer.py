@@ -0,0 +1,171 @@
+"""
+Local lexical scoring for Lost & Found items.
+
+Items are turned into BM25-weighted character n-gram profiles that are
+precomputed once at ingest and stored on the item document. The profiles are
+used as a fast first-stage ranker before the LLM comparison and as a fallback
+scorer when the LLM is unavailable.
+"""
+
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PROFILE_VERSION = 1
+
+# Field weights applied to each n-gram occurrence
+FIELD_WEIGHTS = {
+    "title": 2.0,
+    "category": 1.5,
+    "description": 1.0,
+    "location": 1.0,
+    "image_embedding": 0.5,
+}
+
+NGRAM_SIZES = (3, 4)
+MAX_PROFILE_TERMS = 400
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Piecewise-linear map from BM25 cosine similarity to a 0-100 score. The
+# anchors are set so that two descriptions of the same object written by
+# different people land around the LLM match threshold of 85.
+CALIBRATION_POINTS = [
+    (0.0, 0.0),
+    (0.10, 20.0),
+    (0.25, 50.0),
+    (0.45, 75.0),
+    (0.60, 85.0),
+    (0.80, 95.0),
+    (1.0, 100.0),
+]
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def char_ngrams(text: str) -> List[str]:
+    """Split text into word-bounded character n-grams"""
+    grams = []
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            if len(padded) < n:
+                continue
+            for i in range(len(padded) - n + 1):
+                grams.append(padded[i:i + n])
+    return grams
+
+
+def build_lexical_profile(item: dict) -> dict:
+    """Build the weighted n-gram profile stored alongside an item"""
+    terms: Dict[str, float] = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = item.get(field)
+        if not value:
+            continue
+        for gram in char_ngrams(str(value)):
+            terms[gram] = terms.get(gram, 0.0) + weight
+
+    length = sum(terms.values())
+    if len(terms) > MAX_PROFILE_TERMS:
+        kept = sorted(terms.items(), key=lambda kv: kv[1], reverse=True)[:MAX_PROFILE_TERMS]
+        terms = dict(kept)
+
+    return {
+        "version": PROFILE_VERSION,
+        "length": length,
+        "terms": terms,
+    }
+
+
+def get_lexical_profile(item: dict) -> dict:
+    """Return the stored profile of an item, rebuilding it if missing or stale"""
+    profile = item.get("lexical_profile")
+    if not profile or profile.get("version") != PROFILE_VERSION:
+        profile = build_lexical_profile(item)
+    return profile
+
+
+def calibrate(similarity: float) -> float:
+    """Map a raw cosine similarity onto the 0-100 LLM score scale"""
+    similarity = min(max(similarity, 0.0), 1.0)
+    for (x0, y0), (x1, y1) in zip(CALIBRATION_POINTS, CALIBRATION_POINTS[1:]):
+        if similarity <= x1:
+            return y0 + (similarity - x0) * (y1 - y0) / (x1 - x0)
+    return 100.0
+
+
+class LexicalCorpus:
+    """Document statistics over a set of item profiles for BM25 weighting"""
+
+    def __init__(self, profiles: Iterable[dict], use_idf: bool = True):
+        self.use_idf = use_idf
+        self.doc_count = 0
+        self.doc_freq: Dict[str, int] = {}
+        total_length = 0.0
+        for profile in profiles:
+            self.doc_count += 1
+            total_length += profile["length"]
+            for term in profile["terms"]:
+                self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+        self.avg_length = total_length / self.doc_count if self.doc_count else 1.0
+
+    @classmethod
+    def from_items(cls, items: Iterable[dict], use_idf: bool = True) -> "LexicalCorpus":
+        return cls((get_lexical_profile(item) for item in items), use_idf=use_idf)
+
+    def idf(self, term: str) -> float:
+        if not self.use_idf:
+            return 1.0
+        df = self.doc_freq.get(term, 0)
+        n = max(self.doc_count, df)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def weigh(self, profile: dict) -> Dict[str, float]:
+        """Return the BM25 term weights of a profile"""
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * profile["length"] / (self.avg_length or 1.0))
+        return {
+            term: self.idf(term) * tf * (BM25_K1 + 1) / (tf + norm)
+            for term, tf in profile["terms"].items()
+        }
+
+    def similarity(self, a: dict, b: dict) -> float:
+        """Cosine similarity between the BM25 vectors of two profiles"""
+        return _cosine(self.weigh(a), self.weigh(b))
+
+    def score(self, a: dict, b: dict) -> float:
+        """Calibrated 0-100 similarity score between two items"""
+        return calibrate(self.similarity(get_lexical_profile(a), get_lexical_profile(b)))
+
+    def rank(self, query: dict, candidates: List[dict], top_k: Optional[int] = None,
+             min_score: float = 0.0) -> List[Tuple[dict, float]]:
+        """Rank candidate items against a query item, best first"""
+        query_weights = self.weigh(get_lexical_profile(query))
+        scored = []
+        for candidate in candidates:
+            score = calibrate(_cosine(query_weights, self.weigh(get_lexical_profile(candidate))))
+            if score >= min_score:
+                scored.append((candidate, score))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:top_k] if top_k else scored
+
+
+def _cosine(wa: Dict[str, float], wb: Dict[str, float]) -> float:
+    if len(wa) > len(wb):
+        wa, wb = wb, wa
+    dot = sum(w * wb[t] for t, w in wa.items() if t in wb)
+    na = math.sqrt(sum(w * w for w in wa.values()))
+    nb = math.sqrt(sum(w * w for w in wb.values()))
+    if not na or not nb:
+        return 0.0
+    return dot / (na * nb)
+
+
+def lexical_score(a: dict, b: dict, corpus: Optional[LexicalCorpus] = None) -> float:
+    """Score an item pair, without IDF weighting when no corpus is given"""
+    if corpus is None:
+        # Two documents are too few for meaningful document frequencies
+        corpus = LexicalCorpus.from_items([a, b], use_idf=False)
+    return corpus.score(a, b)
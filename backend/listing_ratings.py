@@ -0,0 +1,125 @@
+"""
+Rating aggregates stored on RentEase listings.
+
+Each listing keeps ``ratingCount``, ``ratingSum`` and a per-star
+``ratingHistogram``. Review writes adjust them with a single ``$inc`` so
+reading a listing's rating never touches the reviews collection.
+``recompute_ratings`` rebuilds them from the reviews and is run for listings
+that predate the fields; run this module directly to repair every listing:
+
+    python listing_ratings.py
+"""
+
+import asyncio
+import os
+from typing import Iterable, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from conditional_get import with_version_bump
+
+STARS = (1, 2, 3, 4, 5)
+RATING_FIELDS = {"ratingCount": 1, "ratingSum": 1, "ratingHistogram": 1}
+
+REPAIR_BATCH_SIZE = 500
+
+
+def empty_ratings() -> dict:
+    return {
+        "ratingCount": 0,
+        "ratingSum": 0,
+        "ratingHistogram": {str(star): 0 for star in STARS},
+    }
+
+
+def rating_added(rating: int) -> dict:
+    return {"$inc": {"ratingCount": 1, "ratingSum": rating, f"ratingHistogram.{rating}": 1}}
+
+
+def rating_removed(rating: int) -> dict:
+    return {"$inc": {"ratingCount": -1, "ratingSum": -rating, f"ratingHistogram.{rating}": -1}}
+
+
+def rating_changed(old: int, new: int) -> Optional[dict]:
+    if old == new:
+        return None
+    return {"$inc": {"ratingSum": new - old, f"ratingHistogram.{old}": -1, f"ratingHistogram.{new}": 1}}
+
+
+def rating_stats(listing: Optional[dict]) -> dict:
+    """Review stats from a listing's stored aggregates"""
+    listing = listing or {}
+    count = listing.get("ratingCount", 0)
+    histogram = listing.get("ratingHistogram") or {}
+    return {
+        "totalReviews": count,
+        "averageRating": round(listing.get("ratingSum", 0) / count, 1) if count else 0,
+        "histogram": {str(star): histogram.get(str(star), 0) for star in STARS},
+    }
+
+
+async def recompute_ratings(db, property_ids: Optional[Iterable[str]] = None) -> int:
+    """Rebuild rating aggregates from the reviews; all listings when no ids are given"""
+    match = {}
+    listing_filter = {}
+    if property_ids is not None:
+        ids = [pid for pid in property_ids if ObjectId.is_valid(pid)]
+        match = {"propertyId": {"$in": ids}}
+        listing_filter = {"_id": {"$in": [ObjectId(pid) for pid in ids]}}
+
+    totals = {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {"propertyId": "$propertyId", "rating": "$rating"}, "count": {"$sum": 1}}},
+    ]
+    async for group in db.reviews.aggregate(pipeline):
+        property_id = group["_id"]["propertyId"]
+        rating = group["_id"]["rating"]
+        if rating not in STARS:
+            continue
+        ratings = totals.setdefault(property_id, empty_ratings())
+        ratings["ratingCount"] += group["count"]
+        ratings["ratingSum"] += rating * group["count"]
+        ratings["ratingHistogram"][str(rating)] += group["count"]
+
+    updated = 0
+    batch = []
+    async for listing in db.listings.find(listing_filter, {"_id": 1}):
+        ratings = totals.get(str(listing["_id"]), empty_ratings())
+        batch.append(UpdateOne({"_id": listing["_id"]}, with_version_bump({"$set": ratings})))
+        if len(batch) >= REPAIR_BATCH_SIZE:
+            await db.listings.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.listings.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+async def backfill_ratings(db) -> int:
+    """Compute aggregates for listings written before they were stored"""
+    ids = [str(doc["_id"]) async for doc in db.listings.find({"ratingCount": {"$exists": False}}, {"_id": 1})]
+    if not ids:
+        return 0
+    return await recompute_ratings(db, ids)
+
+
+async def _repair_all():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    try:
+        db = client[os.environ.get("DB_NAME", "rentease_db")]
+        updated = await recompute_ratings(db)
+        print(f"Recomputed ratings for {updated} listings")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(_repair_all())
@@ -0,0 +1,398 @@
+"""
+Query building for RentEase listing search.
+
+Listings are paged with keyset cursors (see ``pagination``) on the sort
+field and ``_id``, so deep pages cost the same as the first. The ``card`` projection keeps only what a listing card renders.
+
+Location search runs on tokens derived from ``addressText`` when a listing
+is written: every prefix of every address word goes into
+``locationTokens`` and the word trigrams into ``locationTrigrams``. Both are
+indexed arrays, so a prefix match is an exact index lookup and a fuzzy
+match only inspects listings that share at least one trigram.
+
+Endpoints that embed listings in other documents (wishlist entries,
+bookings) hydrate them with ``attach_listings``, which loads every
+referenced listing in a single ``$in`` query.
+
+Listings with coordinates also store them as a GeoJSON point in
+``geoPoint`` under a ``2dsphere`` index. ``near`` searches run a ``$geoNear``
+aggregation sorted by distance and paged by a distance cursor; ``bbox``
+searches are a ``$geoWithin`` filter that keeps the regular sort orders.
+
+The filter panel's counts come from ``facet_pipeline``, one ``$facet``
+aggregation over the listings matching the current filters.
+"""
+
+import json
+import math
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from pagination import (
+    InvalidCursor, decode_cursor as decode_cursor_payload, decode_keyset_cursor,
+    encode_cursor as encode_cursor_payload, encode_keyset_cursor, keyset_filter, keyset_sort,
+)
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+MAX_PREFIX_LENGTH = 20
+# Share of a query word's trigrams a listing needs for a fuzzy match
+FUZZY_MIN_OVERLAP = 0.5
+FUZZY_MIN_WORD_LENGTH = 4
+
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 100.0
+EARTH_RADIUS_METERS = 6378100.0
+
+# Lower bounds of the price facet's buckets; the last one is open-ended
+PRICE_BUCKETS = (0, 5000, 10000, 15000, 20000, 30000, 50000)
+
+# Derived fields stored on listings for search, never returned to clients
+LISTING_INTERNAL_FIELDS = ("locationTokens", "locationTrigrams", "geoPoint")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+BACKFILL_BATCH_SIZE = 500
+
+# sort option -> (field, direction); ``_id`` breaks ties in the same direction
+LISTING_SORTS = {
+    "newest": ("createdAt", -1),
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+}
+
+CARD_PROJECTION = {
+    "title": 1,
+    "type": 1,
+    "price": 1,
+    "addressText": 1,
+    "bedrooms": 1,
+    "bathrooms": 1,
+    "squareFeet": 1,
+    "status": 1,
+    "latitude": 1,
+    "longitude": 1,
+    "ownerId": 1,
+    "ownerName": 1,
+    "createdAt": 1,
+    "ratingCount": 1,
+    "ratingSum": 1,
+    "version": 1,
+    "images": {"$slice": 1},
+}
+
+FULL_PROJECTION = {field: 0 for field in LISTING_INTERNAL_FIELDS}
+
+LISTING_VIEWS = {
+    "full": FULL_PROJECTION,
+    "card": CARD_PROJECTION,
+}
+
+
+class InvalidGeoQuery(ValueError):
+    pass
+
+
+def sort_spec(sort: str) -> list:
+    return keyset_sort(*LISTING_SORTS[sort])
+
+
+def encode_cursor(sort: str, doc: dict) -> str:
+    """Opaque cursor pointing just past ``doc`` in the given sort order"""
+    field, _ = LISTING_SORTS[sort]
+    return encode_keyset_cursor(sort, field, doc)
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[object, ObjectId]:
+    return decode_keyset_cursor(cursor, sort)
+
+
+def after_cursor(sort: str, value, last_id: ObjectId) -> dict:
+    """Filter matching listings that come strictly after the cursor"""
+    return keyset_filter(*LISTING_SORTS[sort], value, last_id)
+
+
+def combine_filters(query: dict, extra: Optional[dict]) -> dict:
+    if not extra:
+        return query
+    if not query:
+        return extra
+    return {"$and": [query, extra]}
+
+
+def filter_key(query: dict) -> str:
+    """Stable cache key for a listing filter"""
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+def location_words(text: str) -> List[str]:
+    """Lowercase, accent-free words of an address or query"""
+    folded = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _WORD_RE.findall(folded.lower())
+
+
+def word_trigrams(word: str) -> List[str]:
+    padded = f" {word} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def location_index_fields(address: str) -> dict:
+    """Search fields to store alongside a listing's addressText"""
+    tokens = set()
+    trigrams = set()
+    for word in location_words(address):
+        for end in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            tokens.add(word[:end])
+        trigrams.update(word_trigrams(word))
+    return {"locationTokens": sorted(tokens), "locationTrigrams": sorted(trigrams)}
+
+
+def location_filter(location: str, fuzzy: bool = False) -> Optional[dict]:
+    """Filter matching listings whose address contains every query word as a prefix.
+
+    With ``fuzzy``, longer words also match addresses sharing enough trigrams,
+    which tolerates a typo or two.
+    """
+    clauses = []
+    for word in location_words(location):
+        prefix = {"locationTokens": word[:MAX_PREFIX_LENGTH]}
+        if not fuzzy or len(word) < FUZZY_MIN_WORD_LENGTH:
+            clauses.append(prefix)
+            continue
+        trigrams = word_trigrams(word)
+        needed = math.ceil(len(trigrams) * FUZZY_MIN_OVERLAP)
+        clauses.append({"$or": [
+            prefix,
+            {
+                "locationTrigrams": {"$in": trigrams},
+                "$expr": {"$gte": [
+                    {"$size": {"$filter": {
+                        "input": {"$ifNull": ["$locationTrigrams", []]},
+                        "cond": {"$in": ["$$this", trigrams]},
+                    }}},
+                    needed,
+                ]},
+            },
+        ]})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+async def backfill_search_fields(db) -> int:
+    """Add search fields to listings written before they existed"""
+    updated = 0
+    batch = []
+    cursor = db.listings.find(
+        {"$or": [
+            {"locationTokens": {"$exists": False}},
+            {"geoPoint": {"$exists": False}, "latitude": {"$type": "number"}, "longitude": {"$type": "number"}},
+        ]},
+        {"addressText": 1, "latitude": 1, "longitude": 1}
+    )
+    async for doc in cursor:
+        fields = listing_search_fields(doc.get("addressText", ""), doc.get("latitude"), doc.get("longitude"))
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            await db.listings.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.listings.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+
+def geo_point(latitude: Optional[float], longitude: Optional[float]) -> Optional[dict]:
+    """GeoJSON point for a listing's coordinates, if it has valid ones"""
+    if latitude is None or longitude is None:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def listing_search_fields(address: str, latitude: Optional[float], longitude: Optional[float]) -> dict:
+    """All derived search fields for a new listing"""
+    fields = location_index_fields(address)
+    point = geo_point(latitude, longitude)
+    if point:
+        fields["geoPoint"] = point
+    return fields
+
+
+def _parse_numbers(value: str, count: int, name: str) -> List[float]:
+    try:
+        numbers = [float(part) for part in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or any(math.isnan(n) or math.isinf(n) for n in numbers):
+        raise InvalidGeoQuery(f"{name} must be {count} comma-separated numbers")
+    return numbers
+
+
+def _check_coordinates(latitude: float, longitude: float):
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise InvalidGeoQuery("Coordinates are out of range")
+
+
+def parse_near(near: str) -> dict:
+    """Parse ``lat,lng`` into a GeoJSON point"""
+    latitude, longitude = _parse_numbers(near, 2, "near")
+    _check_coordinates(latitude, longitude)
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def bbox_filter(bbox: str) -> dict:
+    """Filter for listings inside ``minLat,minLng,maxLat,maxLng``"""
+    min_lat, min_lng, max_lat, max_lng = _parse_numbers(bbox, 4, "bbox")
+    _check_coordinates(min_lat, min_lng)
+    _check_coordinates(max_lat, max_lng)
+    if min_lat >= max_lat or min_lng >= max_lng:
+        raise InvalidGeoQuery("bbox minimums must be below its maximums")
+    ring = [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+    return {"geoPoint": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+
+def radius_filter(point: dict, radius_meters: float) -> dict:
+    """Filter for listings within a radius, usable where $geoNear is not (e.g. counts)"""
+    return {"geoPoint": {"$geoWithin": {
+        "$centerSphere": [point["coordinates"], radius_meters / EARTH_RADIUS_METERS]
+    }}}
+
+
+def _aggregation_projection(projection: dict) -> dict:
+    """Translate a find() projection for use in a $project stage"""
+    translated = {}
+    for field, spec in projection.items():
+        if isinstance(spec, dict) and "$slice" in spec:
+            translated[field] = {"$slice": [f"${field}", spec["$slice"]]}
+        else:
+            translated[field] = spec
+    if any(spec == 1 for spec in projection.values()):
+        translated["distanceMeters"] = 1
+    return translated
+
+
+def geo_near_pipeline(point: dict, radius_meters: float, query: dict, projection: dict,
+                      limit: int, after: Optional[Tuple[float, Sequence[ObjectId]]] = None) -> list:
+    """Aggregation returning listings near a point, nearest first"""
+    geo_near = {
+        "near": point,
+        "distanceField": "distanceMeters",
+        "maxDistance": radius_meters,
+        "spherical": True,
+        "key": "geoPoint",
+    }
+    if after:
+        last_distance, seen_ids = after
+        # minDistance is inclusive; skip listings already returned at that distance
+        geo_near["minDistance"] = last_distance
+        query = combine_filters(query, {"_id": {"$nin": list(seen_ids)}})
+    if query:
+        geo_near["query"] = query
+    return [
+        {"$geoNear": geo_near},
+        {"$limit": limit},
+        {"$project": _aggregation_projection(projection)},
+    ]
+
+
+def encode_distance_cursor(docs: List[dict], previous: Optional[Tuple[float, Sequence[ObjectId]]] = None) -> str:
+    last_distance = docs[-1]["distanceMeters"]
+    seen = [str(doc["_id"]) for doc in docs if doc["distanceMeters"] == last_distance]
+    if previous and previous[0] == last_distance:
+        seen = [str(i) for i in previous[1]] + seen
+    return encode_cursor_payload("distance", last_distance, ids=seen)
+
+
+def decode_distance_cursor(cursor: str) -> Tuple[float, List[ObjectId]]:
+    payload = decode_cursor_payload(cursor, "distance")
+    try:
+        return float(payload["v"]), [ObjectId(i) for i in payload["ids"]]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def facet_pipeline(base: dict, field_filters: Dict[str, object]) -> list:
+    """Count listings per type, status, price bucket and bedroom count.
+
+    ``base`` holds the filters that are not facets (location, geo) and runs
+    first, where it can use indexes. Each facet then applies every filter in
+    ``field_filters`` except its own, so the panel shows how many listings
+    each alternative value would match.
+    """
+    def match_except(field: Optional[str]) -> dict:
+        return {"$match": {name: value for name, value in field_filters.items() if name != field}}
+
+    def count_by(field: str) -> list:
+        return [
+            match_except(field),
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+        ]
+
+    return [
+        {"$match": base},
+        {"$facet": {
+            "type": count_by("type"),
+            "status": count_by("status"),
+            "bedrooms": count_by("bedrooms"),
+            "price": [
+                match_except("price"),
+                # Without this, missing, non-numeric and negative prices would land in the open bucket
+                {"$match": {"price": {"$type": "number", "$gte": 0}}},
+                {"$bucket": {
+                    "groupBy": "$price",
+                    "boundaries": list(PRICE_BUCKETS),
+                    "default": "open",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "total": [match_except(None), {"$count": "count"}],
+        }},
+    ]
+
+
+def facet_counts(result: Optional[dict]) -> dict:
+    """Shape a facet_pipeline result for the API, listing every price bucket"""
+    result = result or {}
+    by_bucket = {group["_id"]: group["count"] for group in result.get("price", [])}
+    price = [
+        {"min": low, "max": high, "count": by_bucket.get(low, 0)}
+        for low, high in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:])
+    ]
+    price.append({"min": PRICE_BUCKETS[-1], "max": None, "count": by_bucket.get("open", 0)})
+    total = result.get("total")
+    return {
+        "type": [{"value": group["_id"], "count": group["count"]} for group in result.get("type", [])],
+        "status": [{"value": group["_id"], "count": group["count"]} for group in result.get("status", [])],
+        "bedrooms": [{"value": group["_id"], "count": group["count"]} for group in result.get("bedrooms", [])],
+        "price": price,
+        "total": total[0]["count"] if total else 0,
+    }
+
+
+async def load_listings(db, listing_ids: Iterable[str], projection: Optional[dict] = CARD_PROJECTION) -> Dict[str, dict]:
+    """Fetch listings by id in one query, keyed by id string"""
+    object_ids = list({ObjectId(listing_id) for listing_id in listing_ids if ObjectId.is_valid(listing_id)})
+    if not object_ids:
+        return {}
+    docs = await db.listings.find({"_id": {"$in": object_ids}}, projection).to_list(None)
+    return {str(doc["_id"]): doc for doc in docs}
+
+
+async def attach_listings(db, items: List[dict], serialize: Callable[[dict], dict],
+                          id_field: str = "listingId", target: str = "listing",
+                          projection: Optional[dict] = CARD_PROJECTION) -> List[dict]:
+    """Embed the listing each item references under ``target``; missing listings become None"""
+    listings = await load_listings(db, (item.get(id_field) for item in items), projection)
+    for item in items:
+        listing = listings.get(item.get(id_field))
+        item[target] = serialize(listing) if listing else None
+    return items
@@ -0,0 +1,264 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Provides counters, gauges and histograms, named spans for timing hot-path stages,
+per-request tallies (such as LLM calls made while serving one request), an
+HTTP middleware that records request latency, and the ``/metrics`` response.
+Metrics are kept per process; each worker exposes its own values.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.label_names), 0.0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down, with optional labels"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative bucket histogram with optional labels"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_number(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_number(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", labels=("method", "route", "status")
+)
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Latency of instrumented hot-path stages", labels=("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "stage_errors_total", "Errors raised or handled inside instrumented stages", labels=("stage",)
+)
+LLM_CALLS = registry.counter("llm_calls_total", "LLM calls made", labels=("purpose",))
+LLM_CALLS_PER_REQUEST = registry.histogram(
+    "llm_calls_per_request", "LLM calls made while serving one request", buckets=COUNT_BUCKETS
+)
+CANDIDATES_SCORED = registry.counter(
+    "match_candidates_scored_total", "Candidate item pairs scored during matching", labels=("scorer",)
+)
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Cache lookups by outcome", labels=("cache", "result")
+)
+CACHE_HIT_RATIO = registry.gauge("cache_hit_ratio", "Fraction of cache lookups that hit", labels=("cache",))
+CACHE_ENTRIES = registry.gauge("cache_entries", "Entries currently held in a cache", labels=("cache",))
+
+# Tallies for the request currently being served
+_request_tally: ContextVar[Optional[dict]] = ContextVar("request_tally", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block of code as a named stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def instrument(stage: str):
+    """Decorator that wraps a sync or async function in a span"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_error(stage: str):
+    """Count an error that a stage handled without raising"""
+    STAGE_ERRORS.inc(stage=stage)
+
+
+def record_llm_call(purpose: str):
+    LLM_CALLS.inc(purpose=purpose)
+    tally = _request_tally.get()
+    if tally is not None:
+        tally["llm_calls"] += 1
+
+
+def record_candidates(scorer: str, count: int):
+    if count:
+        CANDIDATES_SCORED.inc(count, scorer=scorer)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_cache_stats(cache: str, hit_ratio: float, entries: int):
+    CACHE_HIT_RATIO.set(hit_ratio, cache=cache)
+    CACHE_ENTRIES.set(entries, cache=cache)
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Record request latency and per-request tallies"""
+    tally = {"llm_calls": 0}
+    token = _request_tally.set(tally)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        _request_tally.reset(token)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+        if request.url.path != "/metrics":
+            LLM_CALLS_PER_REQUEST.observe(tally["llm_calls"])
+
+
+def metrics_response() -> Response:
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
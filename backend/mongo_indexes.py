@@ -0,0 +1,174 @@
+"""
+Declarative MongoDB indexes for the RentEase API.
+
+``INDEXES`` lists every index the API's queries rely on. ``ensure_indexes``
+runs at startup: it creates missing indexes, warns when an existing index on
+the same keys was built with different options, and then explains each
+entry in ``QUERY_SHAPES`` so a query that would still fall back to a
+collection scan is reported in the log rather than discovered in production.
+"""
+
+import logging
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+from pymongo.errors import OperationFailure
+
+ASCENDING = 1
+DESCENDING = -1
+
+GEOSPHERE = "2dsphere"
+
+IndexKeys = Sequence[Tuple[str, Union[int, str]]]
+
+
+def index_name(keys: IndexKeys) -> str:
+    """Mongo's default name for an index on these keys"""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+class IndexSpec:
+    """One index on a collection"""
+
+    def __init__(self, collection: str, keys: IndexKeys, unique: bool = False):
+        self.collection = collection
+        self.keys = [tuple(key) for key in keys]
+        self.unique = unique
+
+    @property
+    def name(self) -> str:
+        return index_name(self.keys)
+
+    def __repr__(self):
+        unique = " unique" if self.unique else ""
+        return f"{self.collection}.{self.name}{unique}"
+
+
+class QueryShape:
+    """A query the API issues, checked with explain at startup"""
+
+    def __init__(self, collection: str, filter: dict, sort: Optional[IndexKeys] = None):
+        self.collection = collection
+        self.filter = filter
+        self.sort = list(sort) if sort else None
+
+    def __repr__(self):
+        sort = f" sort {self.sort}" if self.sort else ""
+        return f"{self.collection}.find({self.filter}){sort}"
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("users", [("email", ASCENDING)], unique=True),
+    IndexSpec("listings", [("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexSpec("listings", [("price", ASCENDING), ("_id", ASCENDING)]),
+    IndexSpec("listings", [("ownerId", ASCENDING), ("createdAt", DESCENDING)]),
+    IndexSpec("listings", [("locationTokens", ASCENDING)]),
+    IndexSpec("listings", [("locationTrigrams", ASCENDING)]),
+    IndexSpec("listings", [("geoPoint", GEOSPHERE)]),
+    IndexSpec("owner_profiles", [("userId", ASCENDING)]),
+    IndexSpec("reviews", [("propertyId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexSpec("reviews", [("propertyId", ASCENDING), ("userId", ASCENDING)], unique=True),
+    IndexSpec("conversations", [("customerId", ASCENDING), ("updatedAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexSpec("conversations", [("ownerId", ASCENDING), ("updatedAt", DESCENDING), ("_id", DESCENDING)]),
+    IndexSpec("messages", [("conversationId", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)]),
+    IndexSpec("wishlist", [("userId", ASCENDING), ("listingId", ASCENDING)], unique=True),
+    IndexSpec("bookings", [("customerId", ASCENDING), ("createdAt", DESCENDING)]),
+    IndexSpec("bookings", [("ownerId", ASCENDING), ("createdAt", DESCENDING)]),
+]
+
+# Sample values stand in for request parameters; only the shape matters
+_ID = "000000000000000000000000"
+
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("users", {"email": "user@example.com"}),
+    QueryShape("listings", {}, [("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("listings", {"price": {"$gte": 0}}, [("price", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("listings", {"price": {"$gte": 0}}, [("price", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("listings", {"ownerId": _ID}, [("createdAt", DESCENDING)]),
+    QueryShape("listings", {"locationTokens": "main"}, [("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("listings", {"geoPoint": {"$geoWithin": {"$geometry": {
+        "type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]],
+    }}}}),
+    QueryShape("owner_profiles", {"userId": _ID}),
+    QueryShape("reviews", {"propertyId": _ID}, [("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("reviews", {"propertyId": _ID, "userId": _ID}),
+    QueryShape(
+        "conversations",
+        {"$or": [{"customerId": _ID}, {"ownerId": _ID}]},
+        [("updatedAt", DESCENDING), ("_id", DESCENDING)],
+    ),
+    QueryShape("messages", {"conversationId": _ID}, [("createdAt", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("messages", {"conversationId": _ID}, [("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("wishlist", {"userId": _ID}),
+    QueryShape("wishlist", {"userId": _ID, "listingId": _ID}),
+    QueryShape("bookings", {"customerId": _ID}, [("createdAt", DESCENDING)]),
+    QueryShape("bookings", {"ownerId": _ID}, [("createdAt", DESCENDING)]),
+    QueryShape("listings", {"_id": {"$in": [_ID]}}),
+    QueryShape("bookings", {"customerId": _ID, "listingId": _ID, "status": {"$in": ["pending", "confirmed"]}}),
+]
+
+
+def _plan_stages(plan) -> Iterable[str]:
+    """Every stage name in an explain plan, however deeply nested"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+async def _ensure_collection_indexes(collection, specs: List[IndexSpec], report: dict):
+    existing = await collection.index_information()
+    by_keys = {tuple(tuple(key) for key in info["key"]): (name, info) for name, info in existing.items()}
+
+    for spec in specs:
+        found = by_keys.get(tuple(spec.keys))
+        if found is not None:
+            name, info = found
+            if bool(info.get("unique")) != spec.unique:
+                logging.warning(f"Index {name} on {spec.collection} differs from declared {spec!r}")
+                report["mismatched"].append(repr(spec))
+            else:
+                report["verified"].append(repr(spec))
+            continue
+        try:
+            await collection.create_index(spec.keys, name=spec.name, unique=spec.unique)
+            report["created"].append(repr(spec))
+        except OperationFailure as e:
+            # e.g. duplicate keys already stored for a unique index
+            logging.error(f"Could not create index {spec!r}: {str(e)}")
+            report["failed"].append(repr(spec))
+
+
+async def find_collection_scans(db, shapes: List[QueryShape] = QUERY_SHAPES) -> List[str]:
+    """Explain each query shape and return those planned as a collection scan"""
+    scans = []
+    for shape in shapes:
+        cursor = db[shape.collection].find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        try:
+            explain = await cursor.explain()
+        except (OperationFailure, NotImplementedError, AttributeError) as e:
+            logging.debug(f"Could not explain {shape!r}: {str(e)}")
+            continue
+        if "COLLSCAN" in _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})):
+            logging.warning(f"Query falls back to a collection scan: {shape!r}")
+            scans.append(repr(shape))
+    return scans
+
+
+async def ensure_indexes(db, indexes: List[IndexSpec] = INDEXES) -> dict:
+    """Create or verify the declared indexes and check the known query shapes"""
+    report = {"created": [], "verified": [], "mismatched": [], "failed": [], "collectionScans": []}
+    by_collection = {}
+    for spec in indexes:
+        by_collection.setdefault(spec.collection, []).append(spec)
+
+    for name, specs in by_collection.items():
+        await _ensure_collection_indexes(db[name], specs, report)
+
+    report["collectionScans"] = await find_collection_scans(db)
+    return report
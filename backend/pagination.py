@@ -0,0 +1,88 @@
+"""
+Keyset pagination helpers for the RentEase API.
+
+A cursor is an opaque, URL-safe token holding the sort key of the last
+document on a page. The next page is the documents strictly after that key,
+found with a range filter instead of ``skip`` so every page costs the same.
+``_id`` breaks ties between documents with equal sort values.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Tuple
+
+from bson import ObjectId
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def clamp_limit(limit: int, maximum: int) -> int:
+    return max(1, min(limit, maximum))
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+    return value
+
+
+def encode_cursor(kind: str, value, **extra) -> str:
+    """Opaque cursor for the sort order ``kind`` positioned at ``value``"""
+    payload = {"s": kind, "v": _encode_value(value)}
+    payload.update({key: _encode_value(item) for key, item in extra.items()})
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> dict:
+    """Payload of a cursor, checked against the sort order it is used with"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        decoded = {key: _decode_value(value) for key, value in payload.items()}
+    except (ValueError, TypeError, AttributeError, binascii.Error, UnicodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if decoded.get("s") != kind or "v" not in decoded:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return decoded
+
+
+def encode_keyset_cursor(kind: str, field: str, doc: dict) -> str:
+    """Cursor pointing just past ``doc`` in a (field, _id) order"""
+    return encode_cursor(kind, doc.get(field), id=doc["_id"])
+
+
+def decode_keyset_cursor(cursor: str, kind: str) -> Tuple[object, ObjectId]:
+    payload = decode_cursor(cursor, kind)
+    last_id = payload.get("id")
+    if not isinstance(last_id, ObjectId):
+        raise InvalidCursor("Invalid cursor")
+    return payload["v"], last_id
+
+
+def keyset_sort(field: str, direction: int) -> List[Tuple[str, int]]:
+    return [(field, direction), ("_id", direction)]
+
+
+def keyset_filter(field: str, direction: int, value, last_id: ObjectId) -> dict:
+    """Filter for documents strictly after (value, last_id) in the given direction"""
+    op = "$gt" if direction == 1 else "$lt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "_id": {op: last_id}},
+    ]}
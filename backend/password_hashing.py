@@ -0,0 +1,94 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow, so hashing and verification run in a dedicated
+thread pool (bcrypt releases the GIL while it works). At most ``workers``
+hashes run at once and at most ``max_queue`` more wait for a worker; callers
+beyond that wait up to ``queue_timeout`` seconds for a slot and then get
+``PasswordHasherBusy`` so the API can shed load instead of piling up work.
+
+Verification also reports when a stored hash was made with a different cost
+factor than ``BCRYPT_ROUNDS`` so it can be rehashed on login.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from metrics import registry, span
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", "64"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT", "2.0"))
+
+PASSWORD_HASH_PENDING = registry.gauge(
+    "password_hash_pending", "Password hash jobs running or waiting for a worker"
+)
+PASSWORD_HASH_REJECTED = registry.counter(
+    "password_hash_rejected_total", "Password hash jobs rejected because the queue was full"
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout"""
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a bounded thread pool"""
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS,
+                 max_queue: int = PASSWORD_HASH_QUEUE_SIZE,
+                 queue_timeout: float = PASSWORD_HASH_QUEUE_TIMEOUT):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+
+    async def _run(self, stage: str, func, *args):
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            PASSWORD_HASH_REJECTED.inc()
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        self.pending += 1
+        PASSWORD_HASH_PENDING.set(self.pending)
+        try:
+            with span(stage):
+                return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            PASSWORD_HASH_PENDING.set(self.pending)
+            self.slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("password_hash", self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Return (valid, new_hash); new_hash is set when the stored hash needs upgrading"""
+        return await self._run("password_verify", self.context.verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._slots = None
@@ -0,0 +1,70 @@
+"""
+Read-through cache with pluggable storage.
+
+``ReadThroughCache.get_or_load`` returns the stored value for a key, or runs
+the loader and stores its result. Concurrent misses on the same key within
+a worker share one loader call. ``invalidate`` drops the stored value and
+any load still in flight for it, so a load that read old data cannot
+repopulate the cache.
+
+Storage backends only need async ``get`` (returning ``(found, value)``),
+``set`` and ``delete``:
+
+- ``memory`` (default) keeps entries in a bounded ``TTLCache`` in each
+  worker. Invalidation only reaches the worker that made the write; other
+  workers keep their copy until its TTL runs out.
+- A shared backend (e.g. Redis) makes every invalidation visible to all
+  workers; register it in ``create_cache_backend`` and select it with
+  ``READ_CACHE_BACKEND``.
+"""
+
+import os
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+
+from ttl_cache import SingleFlight, TTLCache
+
+READ_CACHE_BACKEND = os.environ.get("READ_CACHE_BACKEND", "memory")
+
+
+class MemoryCacheBackend:
+    """Per-worker storage in a bounded LRU with per-entry TTL"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.entries = TTLCache(name, maxsize, ttl)
+
+    async def get(self, key: Hashable) -> Tuple[bool, Any]:
+        return self.entries.get(key)
+
+    async def set(self, key: Hashable, value: Any):
+        self.entries.set(key, value)
+
+    async def delete(self, key: Hashable):
+        self.entries.invalidate(key)
+
+    def stats(self) -> dict:
+        return self.entries.stats()
+
+
+def create_cache_backend(name: str, maxsize: int, ttl: float, kind: str = READ_CACHE_BACKEND):
+    if kind == "memory":
+        return MemoryCacheBackend(name, maxsize, ttl)
+    raise ValueError(f"Unknown READ_CACHE_BACKEND: {kind}")
+
+
+class ReadThroughCache:
+    """Loads missing values on demand and stores them in a backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._loads = SingleFlight()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the stored value or load it; ``None`` results are not stored"""
+        found, value = await self.backend.get(key)
+        if found:
+            return value
+        return await self._loads.run(key, loader, self.backend.set)
+
+    async def invalidate(self, key: Hashable):
+        self._loads.forget(key)
+        await self.backend.delete(key)
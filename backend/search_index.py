@@ -0,0 +1,183 @@
+"""
+In-memory inverted index for full-text search over Lost & Found items.
+
+The index is loaded lazily from Firestore on first use and then maintained
+incrementally by the item create and delete handlers. Only active items are
+indexed. Each worker holds its own copy and only sees its own writes, so the
+index is rebuilt once it is older than ``SEARCH_INDEX_MAX_AGE_SECONDS`` to
+pick up items created or archived by other workers.
+
+Item dates are free text, so they are parsed into calendar dates when an
+item is indexed. Date filters only match items whose date could be parsed.
+"""
+
+import math
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from lexical_scorer import BM25_B, BM25_K1, FIELD_WEIGHTS
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+SEARCH_INDEX_MAX_AGE_SECONDS = float(os.environ.get('SEARCH_INDEX_MAX_AGE_SECONDS', '300'))
+
+# Non-ISO spellings accepted for item dates; numeric day/month orders are ambiguous
+ITEM_DATE_FORMATS = ("%d %B %Y", "%d %b %Y", "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "at", "by", "for", "from", "in", "is", "it",
+    "its", "of", "on", "or", "the", "this", "to", "was", "with",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words"""
+    return [t for t in _WORD_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def parse_item_date(value: Optional[str]) -> Optional[date]:
+    """Calendar date of an item's free-text date, or None when it is not recognised"""
+    text = (value or "").strip()
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        pass
+    for fmt in ITEM_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_query_date(value: Optional[str]) -> Optional[date]:
+    """Date of a search filter, which must be ISO 8601 (YYYY-MM-DD)"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class ItemSearchIndex:
+    """Inverted index of item terms with BM25 ranking and metadata filters"""
+
+    def __init__(self, max_age: float = SEARCH_INDEX_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._docs: Dict[str, dict] = {}
+        self._total_length = 0.0
+        self._loaded_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, item_id: str):
+        return item_id in self._docs
+
+    def load(self, items_collection):
+        """Rebuild the index from all active items in the collection"""
+        self._postings.clear()
+        self._docs.clear()
+        self._total_length = 0.0
+        for doc in items_collection.where('status', '==', 'active').stream():
+            item = doc.to_dict()
+            if item:
+                self.add(item)
+        self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, items_collection):
+        """Load the index on first use and rebuild it once it is too old"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.load(items_collection)
+
+    def add(self, item: dict):
+        """Index an active item, replacing any previous entry with the same id"""
+        item_id = item['id']
+        self.remove(item_id)
+        if item.get('status') != 'active':
+            return
+
+        term_freqs: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = item.get(field)
+            if not value:
+                continue
+            for term in tokenize(str(value)):
+                term_freqs[term] = term_freqs.get(term, 0.0) + weight
+
+        length = sum(term_freqs.values())
+        for term, tf in term_freqs.items():
+            self._postings.setdefault(term, {})[item_id] = tf
+        self._docs[item_id] = {
+            "type": item.get('type'),
+            "category": (item.get('category') or '').lower(),
+            "date": parse_item_date(item.get('date')),
+            "length": length,
+            "terms": list(term_freqs),
+        }
+        self._total_length += length
+
+    def remove(self, item_id: str) -> bool:
+        """Drop an item from the index, returning whether it was present"""
+        doc = self._docs.pop(item_id, None)
+        if doc is None:
+            return False
+        for term in doc["terms"]:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(item_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= doc["length"]
+        return True
+
+    def _matches_filters(self, doc: dict, type: Optional[str], category: Optional[str],
+                         date_from: Optional[date], date_to: Optional[date]) -> bool:
+        if type and doc["type"] != type:
+            return False
+        if category and doc["category"] != category.lower():
+            return False
+        if (date_from or date_to) and doc["date"] is None:
+            return False
+        if date_from and doc["date"] < date_from:
+            return False
+        if date_to and doc["date"] > date_to:
+            return False
+        return True
+
+    def search(self, query: str, type: Optional[str] = None, category: Optional[str] = None,
+               date_from: Optional[date] = None, date_to: Optional[date] = None) -> List[Tuple[str, float]]:
+        """Return (item_id, score) pairs matching the query, best first"""
+        terms = set(tokenize(query))
+        if not terms or not self._docs:
+            return []
+
+        doc_count = len(self._docs)
+        avg_length = self._total_length / doc_count or 1.0
+        scores: Dict[str, float] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+            for item_id, tf in postings.items():
+                doc = self._docs[item_id]
+                if not self._matches_filters(doc, type, category, date_from, date_to):
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc["length"] / avg_length)
+                scores[item_id] = scores.get(item_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
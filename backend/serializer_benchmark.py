@@ -0,0 +1,105 @@
+"""
+Compare listing response serialization paths.
+
+Builds synthetic listing documents shaped like ``db.listings`` rows and times
+the old path (``serialize_doc`` copy, ``jsonable_encoder``, ``json.dumps``)
+against the new one (``public_doc`` in place, orjson via ``fast_json``):
+
+    python serializer_benchmark.py --count 10000 --repeat 5
+"""
+
+import argparse
+import copy
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from fast_json import dumps, orjson, public_doc
+
+
+def serialize_doc(doc: dict) -> dict:
+    """The key-by-key copy server.py used for every read response"""
+    result = {}
+    for key, value in doc.items():
+        if key == "_id":
+            result["id"] = str(value)
+        elif isinstance(value, ObjectId):
+            result[key] = str(value)
+        elif isinstance(value, datetime):
+            result[key] = value.isoformat()
+        else:
+            result[key] = value
+    return result
+
+
+def make_listings(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    listings = []
+    for i in range(count):
+        created = now - timedelta(minutes=rng.randint(0, 500000))
+        listings.append({
+            "_id": ObjectId(),
+            "title": f"Bright {rng.choice(['studio', 'flat', 'house'])} #{i}",
+            "description": "Close to transit, shops and parks. " * 4,
+            "type": rng.choice(["apartment", "house", "room"]),
+            "price": rng.randint(300, 5000),
+            "location": rng.choice(["Berlin Mitte", "Lisbon Alfama", "Austin Downtown"]),
+            "bedrooms": rng.randint(0, 5),
+            "bathrooms": rng.randint(1, 3),
+            "amenities": ["wifi", "parking", "laundry"][: rng.randint(0, 3)],
+            "images": [f"https://img.example.com/{i}/{n}.jpg" for n in range(3)],
+            "ownerId": str(ObjectId()),
+            "status": "available",
+            "ratingCount": rng.randint(0, 40),
+            "ratingSum": rng.randint(0, 200),
+            "createdAt": created,
+            "updatedAt": created,
+        })
+    return listings
+
+
+def old_path(docs: list) -> bytes:
+    payload = {"success": True, "listings": [serialize_doc(doc) for doc in docs]}
+    return json.dumps(jsonable_encoder(payload)).encode("utf-8")
+
+
+def new_path(docs: list) -> bytes:
+    return dumps({"success": True, "listings": [public_doc(doc) for doc in docs]})
+
+
+def best_of(fn, docs: list, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        # public_doc mutates its input, so every run gets fresh documents
+        batch = copy.deepcopy(docs)
+        start = time.perf_counter()
+        fn(batch)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_listings(args.count)
+    assert json.loads(old_path(copy.deepcopy(docs))) == json.loads(new_path(copy.deepcopy(docs)))
+
+    old = best_of(old_path, docs, args.repeat)
+    new = best_of(new_path, docs, args.repeat)
+    encoder = "orjson" if orjson is not None else "json (orjson not installed)"
+    print(f"{args.count} listings, best of {args.repeat}")
+    print(f"serialize_doc + jsonable_encoder + json: {old * 1000:8.1f} ms")
+    print(f"public_doc + {encoder}: {new * 1000:8.1f} ms")
+    print(f"speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
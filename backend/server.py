@@ -7,18 +7,46 @@ FastAPI Backend with MongoDB
 import os
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr, Field
 from motor.motor_asyncio import AsyncIOMotorClient
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from dotenv import load_dotenv
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from listing_search import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, DEFAULT_RADIUS_KM, MAX_RADIUS_KM, FULL_PROJECTION,
+    LISTING_SORTS, LISTING_VIEWS, InvalidGeoQuery, after_cursor, attach_listings,
+    backfill_search_fields, bbox_filter, combine_filters, decode_cursor, decode_distance_cursor,
+    encode_cursor, encode_distance_cursor, facet_counts, facet_pipeline, filter_key, geo_near_pipeline,
+    geo_point, listing_search_fields, location_filter, location_index_fields, parse_near, radius_filter,
+    sort_spec,
+)
+from chat_realtime import ChatRealtime
+from fast_json import MongoJSONResponse, public_doc
+from conditional_get import (
+    VERSION_PROJECTION, etag_headers, etag_matches, make_etag, not_modified, query_key,
+    version_of, with_version_bump,
+)
+from listing_ratings import (
+    RATING_FIELDS, backfill_ratings, empty_ratings, rating_added, rating_changed, rating_removed,
+    rating_stats,
+)
+from metrics import metrics_middleware, metrics_response
+from mongo_indexes import ensure_indexes
+from pagination import (
+    InvalidCursor, clamp_limit, decode_keyset_cursor, encode_keyset_cursor, keyset_filter, keyset_sort,
+)
+from password_hashing import PasswordHasher, PasswordHasherBusy
+from read_through_cache import ReadThroughCache, create_cache_backend
+from ttl_cache import TTLCache
 
 load_dotenv()
 
@@ -28,9 +56,22 @@ DB_NAME = os.environ.get("DB_NAME", "rentease_db")
 JWT_SECRET = os.environ.get("JWT_SECRET", "rentease_secret_key")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_DAYS = 7
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ENSURE_INDEXES = os.environ.get("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAXSIZE = int(os.environ.get("USER_CACHE_MAXSIZE", "10000"))
+LISTING_COUNT_CACHE_TTL_SECONDS = float(os.environ.get("LISTING_COUNT_CACHE_TTL_SECONDS", "30"))
+LISTING_DETAIL_CACHE_TTL_SECONDS = float(os.environ.get("LISTING_DETAIL_CACHE_TTL_SECONDS", "30"))
+LISTING_DETAIL_CACHE_MAXSIZE = int(os.environ.get("LISTING_DETAIL_CACHE_MAXSIZE", "5000"))
+LISTING_FACET_CACHE_TTL_SECONDS = float(os.environ.get("LISTING_FACET_CACHE_TTL_SECONDS", "30"))
+CONVERSATIONS_PAGE_SIZE = 50
+MAX_CONVERSATIONS_PAGE_SIZE = 100
+MESSAGES_PAGE_SIZE = 50
+MAX_MESSAGES_PAGE_SIZE = 200
+REVIEWS_PAGE_SIZE = 20
+MAX_REVIEWS_PAGE_SIZE = 100
+
+# Password hashing, run on a bounded worker pool
+password_hasher = PasswordHasher()
 
 # Security
 security = HTTPBearer()
@@ -39,6 +80,25 @@ security = HTTPBearer()
 client: AsyncIOMotorClient = None
 db = None
 
+# Users resolved from auth tokens, keyed by user id. Each worker has its own
+# copy, so a change made on one worker shows on the others only after the TTL;
+# role-gated routes read the role through get_role_checked_user instead.
+user_cache = TTLCache("users", USER_CACHE_MAXSIZE, USER_CACHE_TTL_SECONDS)
+
+# Pushes chat events to connected WebSockets on every worker
+chat_realtime = ChatRealtime()
+
+# Total listing counts, keyed by normalized filter
+listing_count_cache = TTLCache("listing_counts", 1000, LISTING_COUNT_CACHE_TTL_SECONDS)
+
+# Filter panel counts, keyed by normalized filter
+listing_facet_cache = TTLCache("listing_facets", 1000, LISTING_FACET_CACHE_TTL_SECONDS)
+
+# Listing details joined with their owner, keyed by str(ObjectId(listing_id))
+listing_detail_cache = ReadThroughCache(create_cache_backend(
+    "listing_details", LISTING_DETAIL_CACHE_MAXSIZE, LISTING_DETAIL_CACHE_TTL_SECONDS
+))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -46,7 +106,32 @@ async def lifespan(app: FastAPI):
     client = AsyncIOMotorClient(MONGO_URL)
     db = client[DB_NAME]
     print(f"Connected to MongoDB: {MONGO_URL}/{DB_NAME}")
+    if ENSURE_INDEXES:
+        try:
+            report = await ensure_indexes(db)
+            print(
+                f"Indexes: {len(report['created'])} created, {len(report['verified'])} verified, "
+                f"{len(report['mismatched']) + len(report['failed'])} with problems, "
+                f"{len(report['collectionScans'])} queries scanning collections"
+            )
+        except Exception as e:
+            print(f"Index bootstrap failed: {e}")
+    try:
+        backfilled = await backfill_search_fields(db)
+        if backfilled:
+            print(f"Added search fields to {backfilled} listings")
+    except Exception as e:
+        print(f"Listing search backfill failed: {e}")
+    try:
+        backfilled = await backfill_ratings(db)
+        if backfilled:
+            print(f"Computed rating aggregates for {backfilled} listings")
+    except Exception as e:
+        print(f"Rating backfill failed: {e}")
+    await chat_realtime.start()
     yield
+    await chat_realtime.stop()
+    password_hasher.shutdown()
     client.close()
     print("MongoDB connection closed")
 
@@ -58,48 +143,136 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.middleware("http")(metrics_middleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
 =======
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends
+import time
+_module_start = time.perf_counter()
+
+from fastapi import (
+    FastAPI, APIRouter, BackgroundTasks, HTTPException, UploadFile, File, Form, Depends, Query, Request, Response
+)
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import sys
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, ValidationError
+from typing import AbstractSet, List, Optional, Tuple
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import asyncio
 import base64
-from io import BytesIO
-from PIL import Image
+import hashlib
+import hmac
+import secrets
 
 # Import Firebase and integrations
-from firebase_config import get_firestore_client, get_storage_bucket
-from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
-import resend
+from firebase_config import (
+    get_firestore_client, get_storage_bucket, MockStorageBucket, verify_local_url, FIRESTORE_BATCH_SIZE
+)
+from startup import LazyResource, lazy_import, startup_profiler, warm_up
+from lexical_scorer import LexicalCorpus, build_lexical_profile, lexical_score
+from search_index import ItemSearchIndex, parse_query_date
+from vector_index import VectorIndex, encode_description_vector, item_vector, top_k
+from item_lifecycle import ItemLifecycleManager
+from item_cleanup import ItemCleanupPipeline
+from metrics import (
+    metrics_middleware, metrics_response, instrument, span,
+    record_error, record_llm_call, record_candidates, record_cache
+)
+from upload_sessions import (
+    ImagePostProcessor, create_upload_session, is_upload_key, make_thumbnail, safe_filename,
+    MAX_UPLOAD_BYTES, IMAGE_JOB_STALE_SECONDS, UPLOAD_PREFIX
+)
+from ttl_cache import TTLCache
+from bulk_import import (
+    parse_import_file, clean_row, read_image_archive, image_digest, guess_content_type
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Initialize Resend
-resend.api_key = os.environ.get('RESEND_API_KEY', 're_placeholder_key')
+# Resend settings, applied when the SDK is first loaded
+RESEND_API_KEY = os.environ.get('RESEND_API_KEY', 're_placeholder_key')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
 
+# Bearer key that may act on any item; unset disables admin access
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', '')
+
+# Heavy integrations loaded on first use or during warm-up
+LLM_MODULE = 'emergentintegrations.llm.chat'
+LAZY_MODULES = (LLM_MODULE, 'resend')
+
+# Matching configuration
+MATCH_THRESHOLD = 85
+LEXICAL_TOP_K = int(os.environ.get('LEXICAL_TOP_K', '20'))
+# Off by default: no cutoff has been validated against confirmed matches, so every
+# candidate in the lexical top k reaches the LLM
+LEXICAL_MIN_SCORE = float(os.environ.get('LEXICAL_MIN_SCORE', '0'))
+DESCRIPTION_TOP_K = int(os.environ.get('DESCRIPTION_TOP_K', '10'))
+DESCRIPTION_MIN_SIMILARITY = float(os.environ.get('DESCRIPTION_MIN_SIMILARITY', '0.5'))
+# How often matches scored by the lexical fallback are retried with the LLM
+MATCH_RESCORE_INTERVAL_SECONDS = int(os.environ.get('MATCH_RESCORE_INTERVAL_SECONDS', '900'))
+
+# Image descriptions are stored in full and cut to this length in comparison prompts
+IMAGE_DESCRIPTION_MAX_CHARS = 600
+
+# Fields stored on item documents for internal use only
+INTERNAL_ITEM_FIELDS = (
+    'lexical_profile', 'description_vector', 'description_vector_model', 'manage_token_hash',
+    'image_key', 'image_queued_at', 'import_id'
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up integrations in the background so the worker serves immediately
+    background_tasks.extend([
+        asyncio.create_task(asyncio.to_thread(warm_up, LAZY_MODULES, [db, storage_bucket])),
+        asyncio.create_task(lifecycle_manager.run_forever(on_report=drop_archived_from_index)),
+        asyncio.create_task(cleanup_pipeline.run_worker()),
+        asyncio.create_task(cleanup_pipeline.run_sweeper()),
+        asyncio.create_task(image_processor.run_worker()),
+        asyncio.create_task(image_processor.run_recovery(claim_stale_image_jobs)),
+        asyncio.create_task(run_match_rescoring()),
+    ])
+    yield
+    for task in background_tasks:
+        task.cancel()
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(metrics_middleware)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
-# Initialize Firestore
-db = get_firestore_client()
-storage_bucket = get_storage_bucket()
+# Firestore and Storage clients, created on first use
+db = LazyResource('firestore', get_firestore_client)
+storage_bucket = LazyResource('storage', get_storage_bucket)
+
+# Full-text index over active items, loaded on first search and rebuilt when stale
+search_index = ItemSearchIndex()
+
+# Matrix of active description vectors, loaded on first matching pass
+vector_index = VectorIndex()
+
+# Background archival of stale and matched items
+lifecycle_manager = ItemLifecycleManager(db)
+
+# Cascade cleanup of blobs and matches after item deletion
+cleanup_pipeline = ItemCleanupPipeline(db, storage_bucket)
+
+# Descriptions by image digest, so identical images are described once
+image_description_cache = TTLCache('image_descriptions', maxsize=512, ttl=3600)
+background_tasks: List[asyncio.Task] = []
 
 # Models
 class User(BaseModel):
@@ -122,7 +295,9 @@ class Item(BaseModel):
     owner_email: EmailStr
     owner_phone: Optional[str] = None
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     image_embedding: Optional[str] = None
+    image_status: Optional[str] = None
     status: str = "active"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -142,65 +317,144 @@ class MatchResult(BaseModel):
     lost_item_id: str
     found_item_id: str
     match_score: float
+    score_source: str = "llm"  # "llm" or "lexical" when the LLM was unavailable
     notified: bool = False
+    confirmed: bool = False
+    archived: bool = False  # set by the lifecycle job once a confirmed match's items are archived
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class UploadSessionCreate(BaseModel):
+    filename: str
+    content_type: str
+
 class EmailRequest(BaseModel):
     recipient_email: EmailStr
     subject: str
     html_content: str
 
 # Helper Functions
+def get_llm():
+    return lazy_import(LLM_MODULE)
+
+def get_resend():
+    resend = lazy_import('resend')
+    resend.api_key = RESEND_API_KEY
+    return resend
+
+def add_item_features(item_dict: dict) -> dict:
+    """Precompute the lexical profile and description vector of an item document"""
+    item_dict['lexical_profile'] = build_lexical_profile(item_dict)
+    if item_dict.get('image_embedding'):
+        item_dict.update(encode_description_vector(item_dict['image_embedding']))
+    return item_dict
+
+def prepare_item_document(item: Item) -> dict:
+    """Build the Firestore document of an item with its precomputed features"""
+    item_dict = item.model_dump()
+    item_dict['created_at'] = item_dict['created_at'].isoformat()
+    return add_item_features(item_dict)
+
+def uploaded_image_exists(image_key: str) -> bool:
+    return is_upload_key(image_key) and storage_bucket.blob(image_key).exists()
+
+def attach_image_job(item_dict: dict, image_key: str) -> dict:
+    """Record the upload an item waits on, so the job can be recovered after a restart"""
+    item_dict['image_key'] = image_key
+    item_dict['image_queued_at'] = datetime.now(timezone.utc).isoformat()
+    return item_dict
+
+def index_item(item_dict: dict):
+    search_index.add(item_dict)
+    vector_index.add(item_dict)
+
+def unindex_item(item_id: str):
+    search_index.remove(item_id)
+    vector_index.remove(item_id)
+
+def hash_manage_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def is_admin(token: str) -> bool:
+    return bool(ADMIN_API_KEY) and hmac.compare_digest(token, ADMIN_API_KEY)
+
+def can_manage_item(item_data: dict, token: str) -> bool:
+    """Whether a bearer token is the item's manage token or the admin key"""
+    if is_admin(token):
+        return True
+    stored = item_data.get('manage_token_hash')
+    return bool(stored) and hmac.compare_digest(stored, hash_manage_token(token))
+
+def public_item(item_data: dict) -> dict:
+    """Copy of an item document without its internal fields"""
+    return {key: value for key, value in item_data.items() if key not in INTERNAL_ITEM_FIELDS}
+
+@instrument("upload_image")
+def upload_bytes_to_storage(content: bytes, path: str, content_type: str) -> str:
+    """Upload raw bytes to Firebase Storage and return public URL"""
+    blob = storage_bucket.blob(path)
+    blob.upload_from_string(content, content_type=content_type)
+    
+    # Make blob publicly accessible
+    blob.make_public()
+    
+    return blob.public_url
+
 async def upload_image_to_storage(file: UploadFile, item_id: str) -> str:
     """Upload image to Firebase Storage and return public URL"""
     try:
         # Read file content
         content = await file.read()
         
-        # Create blob reference
-        blob = storage_bucket.blob(f"items/{item_id}/{file.filename}")
-        
-        # Upload to Firebase Storage
-        blob.upload_from_string(content, content_type=file.content_type)
-        
-        # Make blob publicly accessible
-        blob.make_public()
-        
-        return blob.public_url
+        return upload_bytes_to_storage(content, f"items/{item_id}/{file.filename}", file.content_type)
     except Exception as e:
         logging.error(f"Error uploading image: {str(e)}")
         return None
 
+@instrument("image_embedding")
 async def generate_image_embedding(image_base64: str) -> str:
     """Generate image embedding using Gemini Vision"""
     try:
-        chat = LlmChat(
+        llm = get_llm()
+        chat = llm.LlmChat(
             api_key=os.environ.get('EMERGENT_LLM_KEY'),
             session_id=str(uuid.uuid4()),
             system_message="You are an image analysis expert. Provide detailed descriptions."
         ).with_model("gemini", "gemini-3-flash-preview")
         
-        image_content = ImageContent(image_base64=image_base64)
-        user_message = UserMessage(
+        image_content = llm.ImageContent(image_base64=image_base64)
+        user_message = llm.UserMessage(
             text="Describe this item in extreme detail, focusing on color, shape, size, brand, unique features, and condition.",
             file_contents=[image_content]
         )
         
+        record_llm_call("image_embedding")
         response = await chat.send_message(user_message)
         return response
     except Exception as e:
+        record_error("image_embedding")
         logging.error(f"Error generating embedding: {str(e)}")
         return ""
 
-async def compare_items(lost_item: dict, found_item: dict) -> float:
-    """Compare two items using Gemini AI and return similarity score"""
+@instrument("llm_compare")
+async def compare_items(lost_item: dict, found_item: dict, corpus: Optional[LexicalCorpus] = None,
+                        description_similarity: Optional[float] = None) -> Tuple[float, str]:
+    """Compare two items using Gemini AI and return (similarity score, score source).
+
+    Falls back to the local lexical scorer when the LLM is unavailable; the
+    source is then "lexical" instead of "llm".
+    """
     try:
-        chat = LlmChat(
+        llm = get_llm()
+        chat = llm.LlmChat(
             api_key=os.environ.get('EMERGENT_LLM_KEY'),
             session_id=str(uuid.uuid4()),
             system_message="You are a matching expert. Compare items and provide a similarity score."
         ).with_model("gemini", "gemini-3-flash-preview")
         
+        similarity_line = ""
+        if description_similarity is not None:
+            similarity_line = f"Description similarity (0-1): {description_similarity:.2f}\n"
+        
         prompt = f"""Compare these two items and provide ONLY a similarity score from 0-100.
 
 Lost Item:
@@ -209,7 +463,7 @@ Category: {lost_item['category']}
 Description: {lost_item['description']}
 Location: {lost_item['location']}
 Date: {lost_item['date']}
-Image Description: {lost_item.get('image_embedding', 'No description')}
+Image Description: {(lost_item.get('image_embedding') or 'No description')[:IMAGE_DESCRIPTION_MAX_CHARS]}
 
 Found Item:
 Title: {found_item['title']}
@@ -217,21 +471,26 @@ Category: {found_item['category']}
 Description: {found_item['description']}
 Location: {found_item['location']}
 Date: {found_item['date']}
-Image Description: {found_item.get('image_embedding', 'No description')}
-
+Image Description: {(found_item.get('image_embedding') or 'No description')[:IMAGE_DESCRIPTION_MAX_CHARS]}
+{similarity_line}
 Respond with ONLY a number between 0-100 representing similarity percentage."""
         
-        user_message = UserMessage(text=prompt)
+        user_message = llm.UserMessage(text=prompt)
+        record_llm_call("compare")
         response = await chat.send_message(user_message)
         
         # Extract numeric score
         score_str = ''.join(filter(str.isdigit, response))
-        score = float(score_str) if score_str else 0.0
-        return min(max(score, 0.0), 100.0)
+        if not score_str:
+            raise ValueError(f"No score in LLM response: {response!r}")
+        score = float(score_str)
+        return min(max(score, 0.0), 100.0), "llm"
     except Exception as e:
-        logging.error(f"Error comparing items: {str(e)}")
-        return 0.0
+        record_error("llm_compare")
+        logging.error(f"Error comparing items, using lexical fallback: {str(e)}")
+        return lexical_score(lost_item, found_item, corpus), "lexical"
 
+@instrument("notify")
 async def send_match_notification(lost_item: dict, found_item: dict, match_score: float):
     """Send email notification to lost item owner"""
     try:
@@ -305,16 +564,335 @@ async def send_match_notification(lost_item: dict, found_item: dict, match_score
             "html": html_content
         }
         
-        await asyncio.to_thread(resend.Emails.send, params)
+        await asyncio.to_thread(get_resend().Emails.send, params)
         logging.info(f"Notification sent to {lost_item['owner_email']}")
     except Exception as e:
+        record_error("notify")
         logging.error(f"Failed to send email: {str(e)}")
 
+@instrument("match_pass")
+async def match_found_items(found_items: List[dict]) -> int:
+    """Match found items against the active lost set in a single pass"""
+    lost_docs = db.collection('items').where('type', '==', 'lost').where('status', '==', 'active').stream()
+    lost_items = [lost_doc.to_dict() for lost_doc in lost_docs]
+    if not lost_items or not found_items:
+        return 0
+    
+    # Rank candidates by text and description vector so only the closest ones reach the LLM
+    corpus = LexicalCorpus.from_items(lost_items + found_items)
+    lost_by_id = {lost_item['id']: lost_item for lost_item in lost_items}
+    vector_index.ensure_loaded(db.collection('items'))
+    
+    matches_ref = db.collection('matches')
+    batch = db.batch()
+    pending = 0
+    match_count = 0
+    notifications = []
+    for found_item in found_items:
+        candidates = {
+            lost_item['id']: lost_item
+            for lost_item, _ in corpus.rank(found_item, lost_items, top_k=LEXICAL_TOP_K, min_score=LEXICAL_MIN_SCORE)
+        }
+        record_candidates("lexical", len(lost_items))
+        
+        described = {}
+        found_vector = item_vector(found_item)
+        if found_vector is not None:
+            described = vector_index.similarities(found_vector, type='lost')
+            record_candidates("description", len(described))
+            for lost_id, _ in top_k(described, DESCRIPTION_TOP_K, min_similarity=DESCRIPTION_MIN_SIMILARITY):
+                if lost_id in lost_by_id:
+                    candidates.setdefault(lost_id, lost_by_id[lost_id])
+        
+        record_candidates("llm", len(candidates))
+        for lost_item in candidates.values():
+            # Compare items
+            match_score, score_source = await compare_items(
+                lost_item, found_item, corpus, described.get(lost_item['id'])
+            )
+            
+            # If match score >= 85%, create match and notify. Lexical overlap alone is
+            # not trusted to email owners, so fallback matches are only recorded
+            # until rescore_lexical_matches checks them with the LLM.
+            if match_score >= MATCH_THRESHOLD:
+                notify = score_source == "llm"
+                match = MatchResult(
+                    lost_item_id=lost_item['id'],
+                    found_item_id=found_item['id'],
+                    match_score=match_score,
+                    score_source=score_source,
+                    notified=notify
+                )
+                
+                match_dict = match.model_dump()
+                match_dict['created_at'] = match_dict['created_at'].isoformat()
+                batch.set(matches_ref.document(match.id), match_dict)
+                pending += 1
+                if pending >= FIRESTORE_BATCH_SIZE:
+                    with span("firestore_write"):
+                        batch.commit()
+                    batch = db.batch()
+                    pending = 0
+                match_count += 1
+                if notify:
+                    notifications.append((lost_item, found_item, match_score))
+    if pending:
+        with span("firestore_write"):
+            batch.commit()
+    
+    # Send notifications
+    for lost_item, found_item, match_score in notifications:
+        await send_match_notification(lost_item, found_item, match_score)
+    
+    return match_count
+
+async def rescore_lexical_matches() -> int:
+    """Re-score matches recorded by the lexical fallback and send their notifications.
+
+    Matches the LLM scores below the threshold are dropped. The pass stops at
+    the first comparison that falls back again, since the LLM is still down.
+    """
+    exceptions = lazy_import('google.api_core.exceptions')
+    items = db.collection('items')
+    matches_ref = db.collection('matches')
+    query = matches_ref.where('score_source', '==', 'lexical').where('notified', '==', False)
+    rescored = 0
+    for doc in query.stream():
+        match_dict = doc.to_dict()
+        if match_dict.get('confirmed'):
+            continue
+        lost_doc = items.document(match_dict['lost_item_id']).get()
+        found_doc = items.document(match_dict['found_item_id']).get()
+        if not (lost_doc.exists and found_doc.exists):
+            # Left for the cleanup pipeline
+            continue
+        lost_item, found_item = lost_doc.to_dict(), found_doc.to_dict()
+        if lost_item.get('status') != 'active' or found_item.get('status') != 'active':
+            continue
+        
+        match_score, score_source = await compare_items(lost_item, found_item)
+        if score_source != "llm":
+            break
+        
+        # Only one worker applies the new score, so each owner is emailed once
+        option = db.write_option(last_update_time=doc.update_time)
+        try:
+            if match_score >= MATCH_THRESHOLD:
+                matches_ref.document(doc.id).update(
+                    {'match_score': match_score, 'score_source': 'llm', 'notified': True}, option=option
+                )
+            else:
+                matches_ref.document(doc.id).delete(option=option)
+        except exceptions.FailedPrecondition:
+            continue
+        rescored += 1
+        if match_score >= MATCH_THRESHOLD:
+            await send_match_notification(lost_item, found_item, match_score)
+    return rescored
+
+async def run_match_rescoring(interval: int = MATCH_RESCORE_INTERVAL_SECONDS):
+    """Retry lexical matches with the LLM on a fixed interval until cancelled"""
+    while True:
+        try:
+            rescored = await rescore_lexical_matches()
+            if rescored:
+                logging.info(f"Re-scored {rescored} lexical matches")
+        except Exception as e:
+            logging.error(f"Match re-scoring failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+async def describe_image(content: bytes) -> str:
+    """Vision description of an image, shared by every item with the same image"""
+    digest = image_digest(content)
+    found, description = image_description_cache.get(digest)
+    record_cache("image_dedupe", found)
+    if found:
+        return description
+
+    async def load():
+        # Failed descriptions come back empty and are not cached
+        return await generate_image_embedding(base64.b64encode(content).decode('utf-8')) or None
+    return await image_description_cache.get_or_load(digest, load) or ""
+
+def upload_shared_by_other_items(object_key: str, item_id: str) -> bool:
+    """Whether other items still wait on the same upload, as bulk-imported duplicates do"""
+    query = db.collection('items').where('image_key', '==', object_key).where('image_status', '==', 'processing')
+    return any(doc.id != item_id for doc in query.stream())
+
+async def process_uploaded_image(item_id: str, object_key: str):
+    """Move an uploaded image under its item and derive description and thumbnail"""
+    ref = db.collection('items').document(item_id)
+    snapshot = await asyncio.to_thread(ref.get)
+    if not snapshot.exists or snapshot.to_dict().get('image_status') != 'processing':
+        # Deleted before its turn, or already handled by an earlier run of the job
+        return
+    
+    source = storage_bucket.blob(object_key)
+    content = await asyncio.to_thread(source.download_as_bytes)
+    filename = object_key.rsplit('/', 1)[-1]
+    
+    image_url = await asyncio.to_thread(
+        upload_bytes_to_storage, content, f"items/{item_id}/{filename}", guess_content_type(filename)
+    )
+    thumbnail_url = None
+    try:
+        thumbnail = await asyncio.to_thread(make_thumbnail, content)
+        thumbnail_url = await asyncio.to_thread(
+            upload_bytes_to_storage, thumbnail, f"items/{item_id}/thumbnail.jpg", 'image/jpeg'
+        )
+    except Exception as e:
+        record_error("thumbnail")
+        logging.error(f"Error creating thumbnail for item {item_id}: {str(e)}")
+    image_embedding = await describe_image(content)
+    if not await asyncio.to_thread(upload_shared_by_other_items, object_key, item_id):
+        await asyncio.to_thread(source.delete)
+    
+    snapshot = await asyncio.to_thread(ref.get)
+    if not snapshot.exists:
+        # Deleted while processing, so drop the copied blobs too
+        cleanup_pipeline.enqueue(item_id)
+        return
+    
+    image_fields = {
+        'image_url': image_url,
+        'thumbnail_url': thumbnail_url,
+        'image_embedding': image_embedding,
+        'image_status': 'ready',
+    }
+    item_dict = add_item_features({**snapshot.to_dict(), **image_fields})
+    # Write only what this job derived, so concurrent changes to the item survive
+    changes = {
+        field: item_dict[field]
+        for field in (*image_fields, 'lexical_profile', 'description_vector', 'description_vector_model')
+        if field in item_dict
+    }
+    with span("firestore_write"):
+        await asyncio.to_thread(ref.update, changes)
+    index_item(item_dict)
+    
+    if item_dict.get('import_id'):
+        await finish_import_job(item_dict['import_id'])
+    elif item_dict['type'] == 'found' and item_dict['status'] == 'active':
+        await match_found_items([item_dict])
+
+async def mark_image_failed(item_id: str, object_key: str):
+    """Flag an item whose image job failed, unless another run already finished it"""
+    ref = db.collection('items').document(item_id)
+    snapshot = await asyncio.to_thread(ref.get)
+    if snapshot.exists and snapshot.to_dict().get('image_status') == 'processing':
+        await asyncio.to_thread(ref.update, {'image_status': 'failed'})
+        if snapshot.to_dict().get('import_id'):
+            await finish_import_job(snapshot.to_dict()['import_id'])
+
+def import_has_pending_images(import_id: str) -> bool:
+    query = db.collection('items').where('import_id', '==', import_id).where('image_status', '==', 'processing')
+    return any(True for _ in query.limit(1).stream())
+
+def claim_import_matching(import_id: str) -> List[dict]:
+    """Active items of a bulk import, for the one worker that claims its matching pass"""
+    exceptions = lazy_import('google.api_core.exceptions')
+    ref = db.collection('imports').document(import_id)
+    snapshot = ref.get()
+    if not snapshot.exists or snapshot.to_dict().get('matched'):
+        return []
+    try:
+        ref.update({'matched': True}, option=db.write_option(last_update_time=snapshot.update_time))
+    except exceptions.FailedPrecondition:
+        return []
+    query = db.collection('items').where('import_id', '==', import_id).where('status', '==', 'active')
+    return [doc.to_dict() for doc in query.stream()]
+
+async def finish_import_job(import_id: str):
+    """Match a bulk import in a single pass once the last of its image jobs is done"""
+    if await asyncio.to_thread(import_has_pending_images, import_id):
+        return
+    found_items = await asyncio.to_thread(claim_import_matching, import_id)
+    if found_items:
+        await match_found_items(found_items)
+
+def claim_stale_image_jobs(skip: AbstractSet[str] = frozenset()) -> List[Tuple[str, str]]:
+    """Image jobs queued too long ago, e.g. by a worker that restarted, claimed for this worker.
+
+    Each claim only applies if the item is unchanged since it was read, so
+    when several workers recover at once every job goes to exactly one.
+    """
+    exceptions = lazy_import('google.api_core.exceptions')
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(seconds=IMAGE_JOB_STALE_SECONDS)).isoformat()
+    items = db.collection('items')
+    jobs = []
+    for doc in items.where('image_status', '==', 'processing').stream():
+        item_dict = doc.to_dict()
+        if doc.id in skip or item_dict.get('image_queued_at', '') > cutoff:
+            continue
+        claim = {'image_queued_at': now.isoformat()}
+        if not item_dict.get('image_key'):
+            claim = {'image_status': 'failed'}
+        try:
+            items.document(doc.id).update(claim, option=db.write_option(last_update_time=doc.update_time))
+        except exceptions.FailedPrecondition:
+            # Claimed or changed by another worker since the query
+            continue
+        if item_dict.get('image_key'):
+            jobs.append((doc.id, item_dict['image_key']))
+    return jobs
+
+# Background post-processing of directly uploaded images
+image_processor = ImagePostProcessor(process_uploaded_image, on_failure=mark_image_failed)
+
 # API Endpoints
 @api_router.get("/")
 async def root():
     return {"message": "Lost & Found API"}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics_response()
+
+@api_router.post("/uploads")
+async def create_upload(request: UploadSessionCreate):
+    """Issue a short-lived signed URL for uploading an image straight to storage"""
+    try:
+        return create_upload_session(storage_bucket, request.filename, request.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error creating upload session: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.put("/storage/local/{object_key:path}", include_in_schema=False)
+async def put_local_object(object_key: str, request: Request, expires: str, signature: str):
+    """Receive a signed upload when running on local filesystem storage"""
+    if not isinstance(storage_bucket.resolve(), MockStorageBucket):
+        raise HTTPException(status_code=404, detail="Not found")
+    content_type = request.headers.get('content-type', '')
+    try:
+        valid = verify_local_url(object_key, 'PUT', expires, signature, content_type)
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    
+    content = await request.body()
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    await asyncio.to_thread(storage_bucket.blob(object_key).upload_from_string, content, content_type)
+    return Response(status_code=200)
+
+@api_router.get("/storage/local/{object_key:path}", include_in_schema=False)
+async def get_local_object(object_key: str):
+    """Serve a blob when running on local filesystem storage"""
+    if not isinstance(storage_bucket.resolve(), MockStorageBucket):
+        raise HTTPException(status_code=404, detail="Not found")
+    try:
+        blob = storage_bucket.blob(object_key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not blob.exists():
+        raise HTTPException(status_code=404, detail="Not found")
+    content = await asyncio.to_thread(blob.download_as_bytes)
+    return Response(content=content, media_type=blob.content_type or 'application/octet-stream')
+
 @api_router.post("/items/lost")
 async def create_lost_item(
     title: str = Form(...),
@@ -325,10 +903,14 @@ async def create_lost_item(
     owner_name: str = Form(...),
     owner_email: str = Form(...),
     owner_phone: Optional[str] = Form(None),
-    image: Optional[UploadFile] = File(None)
+    image: Optional[UploadFile] = File(None),
+    image_key: Optional[str] = Form(None)
 ):
     """Submit a lost item"""
     try:
+        if image_key and not uploaded_image_exists(image_key):
+            raise HTTPException(status_code=400, detail="Uploaded image not found")
+        
         item_id = str(uuid.uuid4())
         
         # Upload image if provided
@@ -361,15 +943,29 @@ async def create_lost_item(
             owner_phone=owner_phone,
             image_url=image_url,
             image_embedding=image_embedding,
+            image_status="processing" if image_key else None,
             status="active"
         )
         
+        # Only the hash is stored; the token is shown to the owner this once
+        manage_token = secrets.token_urlsafe(32)
+        
         # Save to Firestore
-        item_dict = item.model_dump()
-        item_dict['created_at'] = item_dict['created_at'].isoformat()
-        db.collection('items').document(item_id).set(item_dict)
+        item_dict = prepare_item_document(item)
+        item_dict['manage_token_hash'] = hash_manage_token(manage_token)
+        if image_key:
+            attach_image_job(item_dict, image_key)
+        with span("firestore_write"):
+            db.collection('items').document(item_id).set(item_dict)
+        index_item(item_dict)
         
-        return item
+        # Directly uploaded images are processed in the background
+        if image_key:
+            image_processor.enqueue(item_id, image_key)
+        
+        return {**item.model_dump(), "manage_token": manage_token}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error creating lost item: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -384,10 +980,14 @@ async def create_found_item(
     owner_name: str = Form(...),
     owner_email: str = Form(...),
     owner_phone: Optional[str] = Form(None),
-    image: Optional[UploadFile] = File(None)
+    image: Optional[UploadFile] = File(None),
+    image_key: Optional[str] = Form(None)
 ):
     """Submit a found item and trigger matching"""
     try:
+        if image_key and not uploaded_image_exists(image_key):
+            raise HTTPException(status_code=400, detail="Uploaded image not found")
+        
         item_id = str(uuid.uuid4())
         
         # Upload image if provided
@@ -420,44 +1020,121 @@ async def create_found_item(
             owner_phone=owner_phone,
             image_url=image_url,
             image_embedding=image_embedding,
+            image_status="processing" if image_key else None,
             status="active"
         )
         
         # Save to Firestore
-        item_dict = item.model_dump()
-        item_dict['created_at'] = item_dict['created_at'].isoformat()
-        db.collection('items').document(item_id).set(item_dict)
+        item_dict = prepare_item_document(item)
+        if image_key:
+            attach_image_job(item_dict, image_key)
+        with span("firestore_write"):
+            db.collection('items').document(item_id).set(item_dict)
+        index_item(item_dict)
         
-        # Check for matches with lost items
-        lost_items = db.collection('items').where('type', '==', 'lost').where('status', '==', 'active').stream()
+        # Check for matches with lost items, after processing a directly uploaded image
+        if image_key:
+            image_processor.enqueue(item_id, image_key)
+        else:
+            await match_found_items([item_dict])
         
-        for lost_doc in lost_items:
-            lost_item = lost_doc.to_dict()
+        return item
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error creating found item: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/items/found/bulk", status_code=202)
+async def bulk_import_found_items(
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
+    images: Optional[UploadFile] = File(None)
+):
+    """Import a CSV or NDJSON dump of found items; images and matching are processed in the background"""
+    try:
+        rows = parse_import_file(await file.read(), file.filename or '')
+        image_files = read_image_archive(await images.read()) if images else {}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        item_dicts = []
+        errors = []
+        # Identical images are staged once and shared by their items' jobs
+        import_id = str(uuid.uuid4())
+        staged_images = {}
+        for row_number, row in rows:
+            try:
+                data = ItemCreate(type="found", **clean_row(row))
+            except ValidationError as e:
+                errors.append({"row": row_number, "error": str(e)})
+                continue
             
-            # Compare items
-            match_score = await compare_items(lost_item, item_dict)
+            image_key = None
+            image_name = row.get('image')
+            if image_name:
+                content = image_files.get(image_name)
+                if content is None:
+                    errors.append({"row": row_number, "error": f"Image not found in archive: {image_name}"})
+                    continue
+                digest = image_digest(content)
+                if digest not in staged_images:
+                    staged_images[digest] = f"{UPLOAD_PREFIX}{import_id}/{digest}/{safe_filename(image_name)}"
+                    await asyncio.to_thread(
+                        upload_bytes_to_storage, content, staged_images[digest], guess_content_type(image_name)
+                    )
+                image_key = staged_images[digest]
             
-            # If match score >= 85%, create match and notify
-            if match_score >= 85:
-                match_id = str(uuid.uuid4())
-                match = MatchResult(
-                    id=match_id,
-                    lost_item_id=lost_item['id'],
-                    found_item_id=item_id,
-                    match_score=match_score,
-                    notified=True
-                )
-                
-                match_dict = match.model_dump()
-                match_dict['created_at'] = match_dict['created_at'].isoformat()
-                db.collection('matches').document(match_id).set(match_dict)
-                
-                # Send notification
-                await send_match_notification(lost_item, item_dict, match_score)
+            item_id = str(uuid.uuid4())
+            item = Item(
+                **data.model_dump(),
+                id=item_id,
+                owner_id=item_id,
+                image_status="processing" if image_key else None,
+                status="active"
+            )
+            item_dict = prepare_item_document(item)
+            item_dict['import_id'] = import_id
+            if image_key:
+                attach_image_job(item_dict, image_key)
+            item_dicts.append(item_dict)
         
-        return item
+        # The last image job to finish matches the whole import
+        if staged_images:
+            db.collection('imports').document(import_id).set({
+                'id': import_id,
+                'matched': False,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            })
+        
+        # Save to Firestore in batched writes
+        items_ref = db.collection('items')
+        for start in range(0, len(item_dicts), FIRESTORE_BATCH_SIZE):
+            batch = db.batch()
+            for item_dict in item_dicts[start:start + FIRESTORE_BATCH_SIZE]:
+                batch.set(items_ref.document(item_dict['id']), item_dict)
+            with span("firestore_write"):
+                batch.commit()
+        for item_dict in item_dicts:
+            index_item(item_dict)
+        
+        # All items are matched in one pass: after the response when no row has
+        # an image, otherwise once the last image job of the import is done
+        for item_dict in item_dicts:
+            if item_dict.get('image_key'):
+                image_processor.enqueue(item_dict['id'], item_dict['image_key'])
+        if item_dicts and not staged_images:
+            background.add_task(match_found_items, item_dicts)
+        
+        return {
+            "imported": len(item_dicts),
+            "item_ids": [item_dict['id'] for item_dict in item_dicts],
+            "images_staged": len(staged_images),
+            "errors": errors
+        }
     except Exception as e:
-        logging.error(f"Error creating found item: {str(e)}")
+        logging.error(f"Error importing found items: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/items/lost")
@@ -468,7 +1145,7 @@ async def get_lost_items():
         docs = db.collection('items').where('type', '==', 'lost').where('status', '==', 'active').stream()
         for doc in docs:
             item_data = doc.to_dict()
-            items.append(item_data)
+            items.append(public_item(item_data))
         return items
     except Exception as e:
         logging.error(f"Error fetching lost items: {str(e)}")
@@ -482,12 +1159,51 @@ async def get_found_items():
         docs = db.collection('items').where('type', '==', 'found').where('status', '==', 'active').stream()
         for doc in docs:
             item_data = doc.to_dict()
-            items.append(item_data)
+            items.append(public_item(item_data))
         return items
     except Exception as e:
         logging.error(f"Error fetching found items: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/items/search")
+async def search_items(
+    q: str = Query(..., min_length=1),
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """Search active items by text with ranked, paginated results"""
+    try:
+        date_from_value = parse_query_date(date_from)
+        date_to_value = parse_query_date(date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        search_index.ensure_loaded(db.collection('items'))
+        results = search_index.search(
+            q, type=type, category=category, date_from=date_from_value, date_to=date_to_value
+        )
+        
+        items = []
+        for item_id, score in results[offset:offset + limit]:
+            doc = db.collection('items').document(item_id).get()
+            # Another worker may have deleted or archived the item since it was indexed
+            if not doc.exists or doc.to_dict().get('status') != 'active':
+                unindex_item(item_id)
+                continue
+            item_data = public_item(doc.to_dict())
+            item_data['search_score'] = round(score, 4)
+            items.append(item_data)
+        
+        return {"items": items, "total": len(results), "limit": limit, "offset": offset}
+    except Exception as e:
+        logging.error(f"Error searching items: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/items/{item_id}")
 async def get_item(item_id: str):
     """Get item by ID"""
@@ -495,7 +1211,7 @@ async def get_item(item_id: str):
         doc = db.collection('items').document(item_id).get()
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Item not found")
-        return doc.to_dict()
+        return public_item(doc.to_dict())
     except HTTPException:
         raise
     except Exception as e:
@@ -504,14 +1220,45 @@ async def get_item(item_id: str):
 
 @api_router.delete("/items/{item_id}")
 async def delete_item(item_id: str):
-    """Delete an item"""
+    """Delete an item and enqueue cleanup of its blobs and matches"""
     try:
         db.collection('items').document(item_id).delete()
+        unindex_item(item_id)
+        cleanup_pipeline.enqueue(item_id)
         return {"message": "Item deleted successfully"}
     except Exception as e:
         logging.error(f"Error deleting item: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/matches/{match_id}/confirm")
+async def confirm_match(match_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Mark a match as confirmed so both items get archived.
+
+    Requires the lost item's manage token, issued when it was reported, or the admin key.
+    """
+    try:
+        ref = db.collection('matches').document(match_id)
+        snapshot = ref.get()
+        if not snapshot.exists:
+            raise HTTPException(status_code=404, detail="Match not found")
+        
+        lost_item = db.collection('items').document(snapshot.to_dict()['lost_item_id']).get()
+        lost_data = lost_item.to_dict() if lost_item.exists else {}
+        if not can_manage_item(lost_data, credentials.credentials):
+            raise HTTPException(status_code=403, detail="Only the owner of the lost item can confirm this match")
+        
+        ref.update({'confirmed': True, 'archived': False})
+        return {"message": "Match confirmed"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error confirming match: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def drop_archived_from_index(report: dict):
+    for item_id in report['archived_ids']:
+        unindex_item(item_id)
+
 # Include router
 app.include_router(api_router)
 
@@ -527,12 +1274,27 @@ app.add_middleware(
 <<<<<<< HEAD
 
 # Helper Functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"}
+    )
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise password_pool_busy()
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Return (valid, new_hash); new_hash is set when the cost factor changed"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise password_pool_busy()
 
 
 def create_token(user_id: str) -> str:
@@ -558,23 +1320,42 @@ def serialize_doc(doc: dict) -> dict:
     return result
 
 
+async def load_user(user_id: str) -> Optional[dict]:
+    """Fetch a user without the password hash"""
+    if not ObjectId.is_valid(user_id):
+        return None
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+    return serialize_doc(user)
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+    return await user_from_token(credentials.credentials)
+
+
+async def user_from_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("user_id")
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await user_cache.get_or_load(user_id, lambda: load_user(user_id))
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return serialize_doc(user)
+        # Copy so handlers cannot mutate the cached entry
+        return dict(user)
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+async def get_role_checked_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """Current user with the role read from the database rather than the user cache"""
+    user = await db.users.find_one({"_id": ObjectId(current_user["id"])}, {"role": 1})
+    current_user["role"] = (user or {}).get("role")
+    return current_user
+
+
 # Pydantic Models
 class RegisterRequest(BaseModel):
     name: str = Field(..., min_length=1)
@@ -659,6 +1440,11 @@ async def health_check():
     return {"message": "RentEase API is running", "status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics_response()
+
+
 # ============ AUTH ROUTES ============
 
 @app.post("/api/auth/register")
@@ -672,7 +1458,7 @@ async def register(request: RegisterRequest):
     user_doc = {
         "name": request.name,
         "email": request.email.lower(),
-        "password": hash_password(request.password),
+        "password": await hash_password(request.password),
         "role": None,
         "createdAt": datetime.now(timezone.utc)
     }
@@ -701,10 +1487,14 @@ async def login(request: LoginRequest):
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
-    if not verify_password(request.password, user["password"]):
+    valid, new_hash = await verify_password(request.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     user_id = str(user["_id"])
+    if new_hash:
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+
     token = create_token(user_id)
     
     return {
@@ -744,6 +1534,7 @@ async def select_role(request: SelectRoleRequest, current_user: dict = Depends(g
         {"_id": ObjectId(current_user["id"])},
         {"$set": {"role": request.role}}
     )
+    user_cache.invalidate(current_user["id"])
     
     return {
         "success": True,
@@ -759,63 +1550,235 @@ async def select_role(request: SelectRoleRequest, current_user: dict = Depends(g
 
 # ============ LISTINGS ROUTES ============
 
+def listing_etag(listing_id: str, listing: dict) -> str:
+    return make_etag("listing", listing_id, version_of(listing))
+
+
+def listings_etag(request: Request, docs: List[dict], has_more: bool, total: int) -> str:
+    """ETag for a page of listings: the request, the page's listings and their versions"""
+    versions = [(str(doc["_id"]), version_of(doc)) for doc in docs]
+    return make_etag("listings", query_key(request), versions, has_more, total)
+
+
+def listing_field_filters(type: Optional[str], minPrice: Optional[float], maxPrice: Optional[float],
+                          status: Optional[str]) -> dict:
+    """Filters on plain listing fields, keyed by field"""
+    filters = {}
+    if type:
+        filters["type"] = type
+    price = {}
+    if minPrice is not None:
+        price["$gte"] = minPrice
+    if maxPrice is not None:
+        price["$lte"] = maxPrice
+    if price:
+        filters["price"] = price
+    if status:
+        filters["status"] = status
+    return filters
+
+
 @app.get("/api/listings")
 async def get_listings(
+    request: Request,
     type: Optional[str] = None,
     minPrice: Optional[float] = None,
     maxPrice: Optional[float] = None,
     location: Optional[str] = None,
-    status: Optional[str] = None
+    fuzzy: bool = False,
+    status: Optional[str] = None,
+    near: Optional[str] = None,
+    radiusKm: float = DEFAULT_RADIUS_KM,
+    bbox: Optional[str] = None,
+    sort: str = "newest",
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    view: str = "full"
 ):
-    query = {}
-    
-    if type:
-        query["type"] = type
-    if minPrice is not None:
-        query["price"] = {"$gte": minPrice}
-    if maxPrice is not None:
-        if "price" in query:
-            query["price"]["$lte"] = maxPrice
-        else:
-            query["price"] = {"$lte": maxPrice}
+    """List listings.
+
+    ``near=lat,lng`` limits results to ``radiusKm`` around a point and sorts
+    them nearest first; ``bbox=minLat,minLng,maxLat,maxLng`` limits them to
+    a box and keeps ``sort``. Both combine with the other filters.
+    """
+    if near and bbox:
+        raise HTTPException(status_code=400, detail="Use either near or bbox, not both")
+    if sort not in LISTING_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(LISTING_SORTS)}")
+    if view not in LISTING_VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of: {', '.join(LISTING_VIEWS)}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    query = listing_field_filters(type, minPrice, maxPrice, status)
     if location:
-        query["addressText"] = {"$regex": location, "$options": "i"}
-    if status:
-        query["status"] = status
+        query = combine_filters(query, location_filter(location, fuzzy))
     
-    cursor = db.listings.find(query).sort("createdAt", -1)
-    listings = []
-    async for doc in cursor:
-        listings.append(serialize_doc(doc))
+    try:
+        if bbox:
+            query = combine_filters(query, bbox_filter(bbox))
+        if near:
+            point = parse_near(near)
+    except InvalidGeoQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {"success": True, "listings": listings}
+    if near:
+        return await get_listings_near(request, point, radiusKm, query, view, limit, cursor)
+    
+    page_query = query
+    if cursor:
+        try:
+            value, last_id = decode_cursor(cursor, sort)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        page_query = combine_filters(query, after_cursor(sort, value, last_id))
+    
+    # Fetch one extra listing to learn whether another page exists
+    docs = await db.listings.find(page_query, LISTING_VIEWS[view]) \
+        .sort(sort_spec(sort)).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    
+    total = await listing_count_cache.get_or_load(
+        filter_key(query), lambda: db.listings.count_documents(query)
+    )
+    
+    etag = listings_etag(request, docs, has_more, total)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    next_cursor = encode_cursor(sort, docs[-1]) if has_more else None
+    return MongoJSONResponse({
+        "success": True,
+        "listings": [public_doc(doc) for doc in docs],
+        "total": total,
+        "limit": limit,
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    }, headers=etag_headers(etag))
+
+
+async def get_listings_near(request: Request, point: dict, radius_km: float, query: dict, view: str,
+                            limit: int, cursor: Optional[str]):
+    radius_meters = max(0.0, min(radius_km, MAX_RADIUS_KM)) * 1000
+    after = None
+    if cursor:
+        try:
+            after = decode_distance_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    pipeline = geo_near_pipeline(point, radius_meters, query, LISTING_VIEWS[view], limit + 1, after)
+    docs = await db.listings.aggregate(pipeline).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    
+    count_query = combine_filters(query, radius_filter(point, radius_meters))
+    total = await listing_count_cache.get_or_load(
+        filter_key(count_query), lambda: db.listings.count_documents(count_query)
+    )
+    
+    etag = listings_etag(request, docs, has_more, total)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    next_cursor = encode_distance_cursor(docs, after) if has_more else None
+    return MongoJSONResponse({
+        "success": True,
+        "listings": [public_doc(doc) for doc in docs],
+        "total": total,
+        "limit": limit,
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    }, headers=etag_headers(etag))
+
+
+@app.get("/api/listings/facets")
+async def get_listing_facets(
+    type: Optional[str] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    location: Optional[str] = None,
+    fuzzy: bool = False,
+    status: Optional[str] = None,
+    near: Optional[str] = None,
+    radiusKm: float = DEFAULT_RADIUS_KM,
+    bbox: Optional[str] = None
+):
+    """Filter panel counts for the same filters as get_listings.
+
+    Each facet applies every filter except its own, so selecting a type
+    still shows the counts of the other types.
+    """
+    if near and bbox:
+        raise HTTPException(status_code=400, detail="Use either near or bbox, not both")
+    
+    base = combine_filters({}, location_filter(location, fuzzy)) if location else {}
+    try:
+        if bbox:
+            base = combine_filters(base, bbox_filter(bbox))
+        if near:
+            radius_meters = max(0.0, min(radiusKm, MAX_RADIUS_KM)) * 1000
+            base = combine_filters(base, radius_filter(parse_near(near), radius_meters))
+    except InvalidGeoQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    fields = listing_field_filters(type, minPrice, maxPrice, status)
+    pipeline = facet_pipeline(base, fields)
+    
+    async def load_facets():
+        results = await db.listings.aggregate(pipeline).to_list(1)
+        return facet_counts(results[0] if results else None)
+    
+    facets = await listing_facet_cache.get_or_load(filter_key({"base": base, "fields": fields}), load_facets)
+    return {"success": True, "facets": facets}
+
+
+async def load_listing_detail(listing_id: str) -> Optional[dict]:
+    """A listing joined with its owner, as served by get_listing"""
+    listing = await db.listings.find_one({"_id": ObjectId(listing_id)}, FULL_PROJECTION)
+    if not listing:
+        return None
+    
+    # Get owner info
+    owner = await db.users.find_one({"_id": ObjectId(listing["ownerId"])}, {"name": 1, "email": 1})
+    listing_data = public_doc(listing)
+    
+    if owner:
+        listing_data["owner"] = {
+            "id": str(owner["_id"]),
+            "name": owner["name"],
+            "email": owner["email"]
+        }
+    return listing_data
+
+
+async def invalidate_listing(listing_id: str):
+    """Drop cached data that a write to this listing may have changed"""
+    listing_count_cache.clear()
+    listing_facet_cache.clear()
+    await listing_detail_cache.invalidate(listing_id)
 
 
 @app.get("/api/listings/{listing_id}")
-async def get_listing(listing_id: str):
+async def get_listing(listing_id: str, request: Request):
     try:
-        listing = await db.listings.find_one({"_id": ObjectId(listing_id)})
+        listing_id = str(ObjectId(listing_id))
+        # Cached details are shared between requests and must not be modified
+        listing = await listing_detail_cache.get_or_load(listing_id, lambda: load_listing_detail(listing_id))
         if not listing:
             raise HTTPException(status_code=404, detail="Listing not found")
         
-        # Get owner info
-        owner = await db.users.find_one({"_id": ObjectId(listing["ownerId"])})
-        listing_data = serialize_doc(listing)
-        
-        if owner:
-            listing_data["owner"] = {
-                "id": str(owner["_id"]),
-                "name": owner["name"],
-                "email": owner["email"]
-            }
+        etag = listing_etag(listing_id, listing)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         
-        return {"success": True, "listing": listing_data}
+        return MongoJSONResponse({"success": True, "listing": listing}, headers=etag_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post("/api/listings")
-async def create_listing(request: ListingCreate, current_user: dict = Depends(get_current_user)):
+async def create_listing(request: ListingCreate, current_user: dict = Depends(get_role_checked_user)):
     if current_user.get("role") != "OWNER":
         raise HTTPException(status_code=403, detail="Only owners can create listings")
     
@@ -836,10 +1799,15 @@ async def create_listing(request: ListingCreate, current_user: dict = Depends(ge
         "status": request.status,
         "ownerId": current_user["id"],
         "ownerName": current_user["name"],
+        **empty_ratings(),
+        "version": 1,
         "createdAt": datetime.now(timezone.utc)
     }
     
-    result = await db.listings.insert_one(listing_doc)
+    search_fields = listing_search_fields(request.addressText, request.latitude, request.longitude)
+    result = await db.listings.insert_one({**listing_doc, **search_fields})
+    listing_count_cache.clear()
+    listing_facet_cache.clear()
     listing_doc["id"] = str(result.inserted_id)
     if "_id" in listing_doc:
         del listing_doc["_id"]
@@ -858,8 +1826,22 @@ async def update_listing(listing_id: str, request: ListingCreate, current_user:
     
     update_data = request.dict(exclude_unset=True)
     update_data["updatedAt"] = datetime.now(timezone.utc)
+    if "addressText" in update_data:
+        update_data.update(location_index_fields(update_data["addressText"]))
+    
+    update = with_version_bump({"$set": update_data})
+    if "latitude" in update_data or "longitude" in update_data:
+        point = geo_point(
+            update_data.get("latitude", listing.get("latitude")),
+            update_data.get("longitude", listing.get("longitude"))
+        )
+        if point:
+            update_data["geoPoint"] = point
+        else:
+            update["$unset"] = {"geoPoint": ""}
     
-    await db.listings.update_one({"_id": ObjectId(listing_id)}, {"$set": update_data})
+    await db.listings.update_one({"_id": ObjectId(listing_id)}, update)
+    await invalidate_listing(str(listing["_id"]))
     
     return {"success": True, "message": "Listing updated successfully"}
 
@@ -874,6 +1856,7 @@ async def delete_listing(listing_id: str, current_user: dict = Depends(get_curre
         raise HTTPException(status_code=403, detail="Not authorized to delete this listing")
     
     await db.listings.delete_one({"_id": ObjectId(listing_id)})
+    await invalidate_listing(str(listing["_id"]))
     
     return {"success": True, "message": "Listing deleted successfully"}
 
@@ -881,16 +1864,16 @@ async def delete_listing(listing_id: str, current_user: dict = Depends(get_curre
 # ============ OWNER ROUTES ============
 
 @app.get("/api/owner/listings")
-async def get_owner_listings(current_user: dict = Depends(get_current_user)):
+async def get_owner_listings(current_user: dict = Depends(get_role_checked_user)):
     if current_user.get("role") != "OWNER":
         raise HTTPException(status_code=403, detail="Only owners can access this")
     
-    cursor = db.listings.find({"ownerId": current_user["id"]}).sort("createdAt", -1)
+    cursor = db.listings.find({"ownerId": current_user["id"]}, FULL_PROJECTION).sort("createdAt", -1)
     listings = []
     async for doc in cursor:
-        listings.append(serialize_doc(doc))
+        listings.append(public_doc(doc))
     
-    return {"success": True, "listings": listings}
+    return MongoJSONResponse({"success": True, "listings": listings})
 
 
 @app.get("/api/owner/profile")
@@ -941,30 +1924,44 @@ async def create_owner_profile(request: OwnerProfileCreate, current_user: dict =
 # ============ REVIEWS ROUTES ============
 
 @app.get("/api/reviews/{property_id}")
-async def get_reviews(property_id: str):
-    cursor = db.reviews.find({"propertyId": property_id}).sort("createdAt", -1)
-    reviews = []
-    async for doc in cursor:
-        reviews.append(serialize_doc(doc))
-    
-    # Calculate stats
-    total_reviews = len(reviews)
-    avg_rating = 0
-    if total_reviews > 0:
-        avg_rating = sum(r["rating"] for r in reviews) / total_reviews
-    
-    return {
+async def get_reviews(request: Request, property_id: str, limit: int = REVIEWS_PAGE_SIZE,
+                      cursor: Optional[str] = None):
+    limit = clamp_limit(limit, MAX_REVIEWS_PAGE_SIZE)
+    query = {"propertyId": property_id}
+    if cursor:
+        try:
+            created_at, last_id = decode_keyset_cursor(cursor, "newest")
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = {"$and": [query, keyset_filter("createdAt", -1, created_at, last_id)]}
+    
+    # Stats come from the aggregates kept on the listing, whose version every review write bumps
+    listing = None
+    if ObjectId.is_valid(property_id):
+        listing = await db.listings.find_one({"_id": ObjectId(property_id)}, {**RATING_FIELDS, **VERSION_PROJECTION})
+    headers = {}
+    if listing:
+        etag = make_etag("reviews", property_id, version_of(listing), query_key(request))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        headers = etag_headers(etag)
+    
+    docs = await db.reviews.find(query).sort(keyset_sort("createdAt", -1)).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    
+    next_cursor = encode_keyset_cursor("newest", "createdAt", docs[-1]) if has_more else None
+    return MongoJSONResponse({
         "success": True,
-        "reviews": reviews,
-        "stats": {
-            "totalReviews": total_reviews,
-            "averageRating": round(avg_rating, 1)
-        }
-    }
+        "reviews": [public_doc(doc) for doc in docs],
+        "stats": rating_stats(listing),
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    }, headers=headers)
 
 
 @app.post("/api/reviews/{property_id}")
-async def create_review(property_id: str, request: ReviewCreate, current_user: dict = Depends(get_current_user)):
+async def create_review(property_id: str, request: ReviewCreate, current_user: dict = Depends(get_role_checked_user)):
     if current_user.get("role") != "CUSTOMER":
         raise HTTPException(status_code=403, detail="Only customers can write reviews")
     
@@ -990,8 +1987,13 @@ async def create_review(property_id: str, request: ReviewCreate, current_user: d
         "createdAt": datetime.now(timezone.utc)
     }
     
-    result = await db.reviews.insert_one(review_doc)
+    try:
+        result = await db.reviews.insert_one(review_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="You have already reviewed this property")
     review_doc["id"] = str(result.inserted_id)
+    await db.listings.update_one({"_id": ObjectId(property_id)}, with_version_bump(rating_added(request.rating)))
+    await listing_detail_cache.invalidate(str(ObjectId(property_id)))
     
     return {"success": True, "review": serialize_doc(review_doc)}
 
@@ -1012,7 +2014,15 @@ async def update_review(review_id: str, request: ReviewUpdate, current_user: dic
         update_data["comment"] = request.comment
     update_data["updatedAt"] = datetime.now(timezone.utc)
     
-    await db.reviews.update_one({"_id": ObjectId(review_id)}, {"$set": update_data})
+    # The pre-update document gives the rating actually replaced, even under concurrent edits
+    previous = await db.reviews.find_one_and_update(
+        {"_id": ObjectId(review_id)}, {"$set": update_data}, return_document=ReturnDocument.BEFORE
+    )
+    if previous:
+        change = rating_changed(previous["rating"], request.rating) if request.rating is not None else None
+        # The listing's reviews changed even when its rating did not
+        await db.listings.update_one({"_id": ObjectId(previous["propertyId"])}, with_version_bump(change))
+        await listing_detail_cache.invalidate(str(ObjectId(previous["propertyId"])))
     
     return {"success": True, "message": "Review updated successfully"}
 
@@ -1026,33 +2036,150 @@ async def delete_review(review_id: str, current_user: dict = Depends(get_current
     if review["userId"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized to delete this review")
     
-    await db.reviews.delete_one({"_id": ObjectId(review_id)})
+    deleted = await db.reviews.find_one_and_delete({"_id": ObjectId(review_id)})
+    if deleted:
+        await db.listings.update_one(
+            {"_id": ObjectId(deleted["propertyId"])}, with_version_bump(rating_removed(deleted["rating"]))
+        )
+        await listing_detail_cache.invalidate(str(ObjectId(deleted["propertyId"])))
     
     return {"success": True, "message": "Review deleted successfully"}
 
 
 # ============ CONVERSATIONS ROUTES ============
 
+def message_summary(msg_doc: dict, message_id) -> dict:
+    """Copy of a message stored on its conversation as lastMessage"""
+    return {
+        "id": str(message_id),
+        "conversationId": msg_doc["conversationId"],
+        "senderId": msg_doc["senderId"],
+        "senderName": msg_doc["senderName"],
+        "content": msg_doc["content"],
+        "createdAt": msg_doc["createdAt"]
+    }
+
+
+async def publish_chat_event(conversation_id: str, event: dict):
+    """Push a chat event to connected clients; run after the response is sent"""
+    try:
+        await chat_realtime.publish(conversation_id, event)
+    except Exception as e:
+        # Clients still get the change on their next fetch
+        print(f"Chat push failed: {e}")
+
+
+async def fill_last_messages(docs: List[dict]):
+    """Set lastMessage on conversations created before it was stored, in one query"""
+    missing = {str(doc["_id"]): doc for doc in docs if "lastMessage" not in doc}
+    if not missing:
+        return
+    
+    pipeline = [
+        {"$match": {"conversationId": {"$in": list(missing)}}},
+        {"$sort": {"createdAt": -1}},
+        {"$group": {"_id": "$conversationId", "message": {"$first": "$$ROOT"}}}
+    ]
+    for doc in missing.values():
+        doc["lastMessage"] = None
+    async for group in db.messages.aggregate(pipeline):
+        message = group["message"]
+        missing[group["_id"]]["lastMessage"] = message_summary(message, message["_id"])
+    
+    await db.conversations.bulk_write([
+        UpdateOne({"_id": doc["_id"], "lastMessage": {"$exists": False}}, {"$set": {"lastMessage": doc["lastMessage"]}})
+        for doc in missing.values()
+    ], ordered=False)
+
+
 @app.get("/api/conversations")
-async def get_conversations(current_user: dict = Depends(get_current_user)):
+async def get_conversations(
+    limit: int = CONVERSATIONS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    limit = clamp_limit(limit, MAX_CONVERSATIONS_PAGE_SIZE)
     query = {"$or": [
         {"customerId": current_user["id"]},
         {"ownerId": current_user["id"]}
     ]}
+    if cursor:
+        try:
+            updated_at, last_id = decode_keyset_cursor(cursor, "updated")
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = {"$and": [query, keyset_filter("updatedAt", -1, updated_at, last_id)]}
+    
+    docs = await db.conversations.find(query).sort(keyset_sort("updatedAt", -1)).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    await fill_last_messages(docs)
+    
+    next_cursor = encode_keyset_cursor("updated", "updatedAt", docs[-1]) if has_more else None
+    for doc in docs:
+        public_doc(doc)
+        doc["unreadCount"] = (doc.get("unread") or {}).get(current_user["id"], 0)
+    
+    return MongoJSONResponse({
+        "success": True,
+        "conversations": docs,
+        "hasMore": has_more,
+        "nextCursor": next_cursor
+    })
+
+
+@app.get("/api/conversations/unread-count")
+async def get_unread_count(current_user: dict = Depends(get_current_user)):
+    user_id = current_user["id"]
+    pipeline = [
+        {"$match": {"$or": [{"customerId": user_id}, {"ownerId": user_id}], f"unread.{user_id}": {"$gt": 0}}},
+        {"$group": {"_id": None, "total": {"$sum": f"$unread.{user_id}"}, "conversations": {"$sum": 1}}}
+    ]
+    totals = await db.conversations.aggregate(pipeline).to_list(1)
+    total = totals[0] if totals else {"total": 0, "conversations": 0}
     
-    cursor = db.conversations.find(query).sort("updatedAt", -1)
-    conversations = []
-    async for doc in cursor:
-        conv = serialize_doc(doc)
-        # Get last message
-        last_msg = await db.messages.find_one(
-            {"conversationId": str(doc["_id"])},
-            sort=[("createdAt", -1)]
+    return {"success": True, "unreadCount": total["total"], "conversationsWithUnread": total["conversations"]}
+
+
+@app.post("/api/conversations/{conversation_id}/read")
+async def mark_conversation_read(
+    conversation_id: str,
+    background: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
+    user_id = current_user["id"]
+    for _ in range(3):
+        conv = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
+        if not conv:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        if conv["customerId"] != user_id and conv["ownerId"] != user_id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        
+        last_message = conv.get("lastMessage")
+        last_read = {
+            "messageId": last_message["id"] if last_message else None,
+            "readAt": datetime.now(timezone.utc)
+        }
+        # Only reset if no message arrived since the conversation was read
+        result = await db.conversations.update_one(
+            {"_id": conv["_id"], "lastMessage.id": last_read["messageId"]},
+            {"$set": {f"unread.{user_id}": 0, f"lastRead.{user_id}": last_read}}
         )
-        conv["lastMessage"] = serialize_doc(last_msg) if last_msg else None
-        conversations.append(conv)
+        if result.matched_count:
+            break
+    else:
+        # New messages kept arriving; the client retries against the latest one
+        raise HTTPException(status_code=409, detail="Conversation changed while marking it read, try again")
+    
+    background.add_task(publish_chat_event, conversation_id, {
+        "type": "read",
+        "conversationId": conversation_id,
+        "userId": user_id,
+        "messageId": last_read["messageId"]
+    })
     
-    return {"success": True, "conversations": conversations}
+    return {"success": True, "lastRead": serialize_doc(last_read)}
 
 
 @app.post("/api/conversations")
@@ -1078,6 +2205,7 @@ async def create_conversation(request: ConversationCreate, current_user: dict =
         "customerName": current_user["name"],
         "ownerId": request.ownerId,
         "ownerName": owner["name"] if owner else "Unknown",
+        "lastMessage": None,
         "createdAt": datetime.now(timezone.utc),
         "updatedAt": datetime.now(timezone.utc)
     }
@@ -1103,7 +2231,24 @@ async def get_conversation(conversation_id: str, current_user: dict = Depends(ge
 # ============ MESSAGES ROUTES ============
 
 @app.get("/api/messages/{conversation_id}")
-async def get_messages(conversation_id: str, current_user: dict = Depends(get_current_user)):
+async def get_messages(
+    conversation_id: str,
+    limit: int = MESSAGES_PAGE_SIZE,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Messages in ascending order.
+
+    By default the latest ``limit`` messages; ``before`` pages back through
+    older history and ``after`` returns only messages newer than a cursor,
+    for polling. ``hasMore`` refers to older messages, or to newer ones
+    with ``after``.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    limit = clamp_limit(limit, MAX_MESSAGES_PAGE_SIZE)
+    
     conv = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -1111,16 +2256,39 @@ async def get_messages(conversation_id: str, current_user: dict = Depends(get_cu
     if conv["customerId"] != current_user["id"] and conv["ownerId"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    cursor = db.messages.find({"conversationId": conversation_id}).sort("createdAt", 1)
-    messages = []
-    async for doc in cursor:
-        messages.append(serialize_doc(doc))
-    
-    return {"success": True, "messages": messages}
+    query = {"conversationId": conversation_id}
+    direction = 1 if after else -1
+    if before or after:
+        try:
+            created_at, last_id = decode_keyset_cursor(before or after, "message")
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = {"$and": [query, keyset_filter("createdAt", direction, created_at, last_id)]}
+    
+    docs = await db.messages.find(query).sort(keyset_sort("createdAt", direction)).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction == -1:
+        docs.reverse()
+    
+    # Oldest message returned, to page back with before=, and newest, to poll with after=
+    prev_cursor = encode_keyset_cursor("message", "createdAt", docs[0]) if docs else before
+    next_cursor = encode_keyset_cursor("message", "createdAt", docs[-1]) if docs else after
+    return MongoJSONResponse({
+        "success": True,
+        "messages": [public_doc(doc) for doc in docs],
+        "hasMore": has_more,
+        "prevCursor": prev_cursor,
+        "nextCursor": next_cursor
+    })
 
 
 @app.post("/api/messages")
-async def create_message(request: MessageCreate, current_user: dict = Depends(get_current_user)):
+async def create_message(
+    request: MessageCreate,
+    background: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
     conv = await db.conversations.find_one({"_id": ObjectId(request.conversationId)})
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -1138,30 +2306,95 @@ async def create_message(request: MessageCreate, current_user: dict = Depends(ge
     
     result = await db.messages.insert_one(msg_doc)
     msg_doc["id"] = str(result.inserted_id)
+    message = serialize_doc(msg_doc)
+    
+    # Update the inbox preview and unread state; the sender has read their own message
+    sender_id = current_user["id"]
+    recipient_id = conv["ownerId"] if sender_id == conv["customerId"] else conv["customerId"]
+    conv_update = {
+        "$set": {
+            "updatedAt": msg_doc["createdAt"],
+            "lastMessage": message_summary(msg_doc, result.inserted_id),
+            f"unread.{sender_id}": 0,
+            f"lastRead.{sender_id}": {"messageId": message["id"], "readAt": msg_doc["createdAt"]}
+        }
+    }
+    if recipient_id != sender_id:
+        conv_update["$inc"] = {f"unread.{recipient_id}": 1}
+    await db.conversations.update_one({"_id": ObjectId(request.conversationId)}, conv_update)
     
-    # Update conversation timestamp
-    await db.conversations.update_one(
-        {"_id": ObjectId(request.conversationId)},
-        {"$set": {"updatedAt": datetime.now(timezone.utc)}}
-    )
+    background.add_task(publish_chat_event, request.conversationId, {
+        "type": "message",
+        "conversationId": request.conversationId,
+        "message": message
+    })
+    
+    return {"success": True, "message": message}
+
+
+@app.websocket("/api/ws/chat")
+async def chat_socket(websocket: WebSocket, token: str = ""):
+    """Push channel for chat.
+
+    Authenticate with ``?token=<jwt>``, then send ``{"type": "join",
+    "conversationId": ...}`` for each open conversation. New messages arrive
+    as ``{"type": "message", ...}`` events; ``leave``, ``typing`` and ``ping``
+    are also understood.
+    """
+    await websocket.accept()
+    try:
+        user = await user_from_token(token)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
     
-    return {"success": True, "message": serialize_doc(msg_doc)}
+    joined = set()
+    try:
+        while True:
+            data = await websocket.receive_json()
+            kind = data.get("type") if isinstance(data, dict) else None
+            conversation_id = str(data.get("conversationId", "")) if kind else ""
+            
+            if kind == "join":
+                conv = None
+                if ObjectId.is_valid(conversation_id):
+                    conv = await db.conversations.find_one(
+                        {"_id": ObjectId(conversation_id)}, {"customerId": 1, "ownerId": 1}
+                    )
+                if not conv or user["id"] not in (conv["customerId"], conv["ownerId"]):
+                    await websocket.send_json({"type": "error", "conversationId": conversation_id, "message": "Not authorized"})
+                    continue
+                chat_realtime.hub.join(conversation_id, websocket)
+                joined.add(conversation_id)
+                await websocket.send_json({"type": "joined", "conversationId": conversation_id})
+            elif kind == "leave":
+                chat_realtime.hub.leave(conversation_id, websocket)
+                joined.discard(conversation_id)
+            elif kind == "typing" and conversation_id in joined:
+                await chat_realtime.publish(conversation_id, {
+                    "type": "typing",
+                    "conversationId": conversation_id,
+                    "userId": user["id"],
+                    "isTyping": bool(data.get("isTyping"))
+                })
+            elif kind == "ping":
+                await websocket.send_json({"type": "pong"})
+            else:
+                await websocket.send_json({"type": "error", "message": "Unknown event"})
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        chat_realtime.hub.disconnect(websocket)
 
 
 # ============ WISHLIST ROUTES ============
 
 @app.get("/api/wishlist")
 async def get_wishlist(current_user: dict = Depends(get_current_user)):
-    cursor = db.wishlist.find({"userId": current_user["id"]})
-    items = []
-    async for doc in cursor:
-        # Get listing details
-        listing = await db.listings.find_one({"_id": ObjectId(doc["listingId"])})
-        item = serialize_doc(doc)
-        item["listing"] = serialize_doc(listing) if listing else None
-        items.append(item)
+    docs = await db.wishlist.find({"userId": current_user["id"]}).to_list(None)
+    items = await attach_listings(db, [public_doc(doc) for doc in docs], public_doc)
     
-    return {"success": True, "wishlist": items}
+    return MongoJSONResponse({"success": True, "wishlist": items})
 
 
 @app.post("/api/wishlist")
@@ -1238,24 +2471,17 @@ Write an engaging property description:"""
 # ============ BOOKINGS ROUTES ============
 
 @app.get("/api/bookings")
-async def get_bookings(current_user: dict = Depends(get_current_user)):
+async def get_bookings(current_user: dict = Depends(get_role_checked_user)):
     if current_user.get("role") == "OWNER":
-        # Get bookings for owner's listings
-        listings = await db.listings.find({"ownerId": current_user["id"]}).to_list(None)
-        listing_ids = [str(l["_id"]) for l in listings]
-        query = {"listingId": {"$in": listing_ids}}
+        # Bookings carry the listing owner's id, so no listing lookup is needed
+        query = {"ownerId": current_user["id"]}
     else:
         query = {"customerId": current_user["id"]}
     
-    cursor = db.bookings.find(query).sort("createdAt", -1)
-    bookings = []
-    async for doc in cursor:
-        booking = serialize_doc(doc)
-        listing = await db.listings.find_one({"_id": ObjectId(doc["listingId"])})
-        booking["listing"] = serialize_doc(listing) if listing else None
-        bookings.append(booking)
+    docs = await db.bookings.find(query).sort("createdAt", -1).to_list(None)
+    bookings = await attach_listings(db, [public_doc(doc) for doc in docs], public_doc)
     
-    return {"success": True, "bookings": bookings}
+    return MongoJSONResponse({"success": True, "bookings": bookings})
 
 
 @app.post("/api/bookings")
@@ -1317,4 +2543,10 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+
+startup_profiler.record("import server", time.perf_counter() - _module_start)
+
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    warm_up(LAZY_MODULES, [db, storage_bucket])
+    print(startup_profiler.report())
 >>>>>>> e17768b1f796c0c35dcd889004bc97173ab086fc
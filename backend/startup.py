@@ -0,0 +1,126 @@
+"""
+Lazy loading of heavy integrations and startup profiling.
+
+Heavy SDKs and remote clients are loaded on first use through
+``lazy_import`` and ``LazyResource`` instead of at module import, and can be
+warmed up in the background once the app has started. Every load is timed
+by ``startup_profiler`` so the cost of each module and client shows up in
+the ``--profile-startup`` report.
+"""
+
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Tuple
+
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', '2.0'))
+
+
+class StartupProfiler:
+    """Records how long each import and initialization step took"""
+
+    def __init__(self):
+        self.steps: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.steps.append((name, seconds))
+
+    @contextmanager
+    def timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.steps)
+
+    def report(self, budget: float = STARTUP_BUDGET_SECONDS) -> str:
+        width = max([len(name) for name, _ in self.steps] + [len("total")])
+        lines = [f"{'step'.ljust(width)}  seconds"]
+        for name, seconds in sorted(self.steps, key=lambda step: step[1], reverse=True):
+            lines.append(f"{name.ljust(width)}  {seconds:7.3f}")
+        lines.append(f"{'total'.ljust(width)}  {self.total:7.3f}")
+        status = "within" if self.total <= budget else "OVER"
+        lines.append(f"Startup budget {budget:.3f}s: {status}")
+        return "\n".join(lines)
+
+
+startup_profiler = StartupProfiler()
+
+
+_imported = {}
+_import_lock = threading.Lock()
+
+
+def lazy_import(module_name: str):
+    """Import a module on first use, recording its import time"""
+    module = _imported.get(module_name)
+    if module is None:
+        # sys.modules may hold a partially initialized module while another
+        # thread is still importing it, so wait on the lock instead
+        with _import_lock:
+            module = _imported.get(module_name)
+            if module is None:
+                already_loaded = module_name in sys.modules
+                start = time.perf_counter()
+                module = importlib.import_module(module_name)
+                if not already_loaded:
+                    startup_profiler.record(f"import {module_name}", time.perf_counter() - start)
+                _imported[module_name] = module
+    return module
+
+
+class LazyResource:
+    """Proxy that creates the wrapped object on first attribute access"""
+
+    def __init__(self, name: str, factory: Callable):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def resolve(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with startup_profiler.timed(f"init {self._name}"):
+                        self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+
+def warm_up(modules: Iterable[str] = (), resources: Iterable[LazyResource] = ()):
+    """Load modules and resources ahead of first use"""
+    start = time.perf_counter()
+    for resource in resources:
+        try:
+            resource.resolve()
+        except Exception as e:
+            logging.error(f"Warm-up of {resource._name} failed: {str(e)}")
+    for module_name in modules:
+        try:
+            lazy_import(module_name)
+        except Exception as e:
+            logging.error(f"Warm-up import of {module_name} failed: {str(e)}")
+    elapsed = time.perf_counter() - start
+    logging.info(f"Warm-up finished in {elapsed:.3f}s")
+    if startup_profiler.total > STARTUP_BUDGET_SECONDS:
+        logging.warning(
+            f"Startup took {startup_profiler.total:.3f}s, over the "
+            f"{STARTUP_BUDGET_SECONDS:.3f}s budget"
+        )
@@ -0,0 +1,138 @@
+"""
+Bounded in-process cache with per-entry TTL and single-flight loading.
+
+Entries are evicted least-recently-used once ``maxsize`` is reached and
+expire ``ttl`` seconds after being stored. Concurrent misses on the same key
+share a single loader call through ``SingleFlight``, which
+``ReadThroughCache`` uses too. Lookups are counted in the
+``cache_requests_total`` metric under the cache's name, and the hit ratio
+and size are exported as gauges.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from metrics import record_cache, record_cache_stats
+
+
+class SingleFlight:
+    """Runs one loader per key at a time and stores its result.
+
+    Callers that miss while a load is in flight wait for it instead of
+    starting their own. ``forget`` detaches the in-flight load of a key, so a
+    load that read data from before an invalidation cannot store it.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        store: Callable[[Hashable, Any], Awaitable[None]],
+    ) -> Any:
+        """Load a key, sharing any load in flight; ``None`` results are not stored"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, store))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader, store) -> Any:
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+            if value is not None and self._inflight.get(key) is task:
+                await store(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def forget(self, key: Hashable):
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        self._inflight.clear()
+
+
+class TTLCache:
+    """LRU cache whose entries expire after a fixed time to live"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loads = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value) without loading"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._record(True)
+                return True, value
+            del self._entries[key]
+        self._record(False)
+        return False, None
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        record_cache(self.name, hit)
+        self._publish_stats()
+
+    def _publish_stats(self):
+        lookups = self.hits + self.misses
+        record_cache_stats(self.name, self.hits / lookups if lookups else 0.0, len(self._entries))
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        self._publish_stats()
+
+    def invalidate(self, key: Hashable):
+        """Drop a key, including any load that is still in flight for it"""
+        self._entries.pop(key, None)
+        self._loads.forget(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._loads.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value or load it, coalescing concurrent misses.
+
+        ``None`` results are returned but not cached.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+        return await self._loads.run(key, loader, self._store)
+
+    async def _store(self, key: Hashable, value: Any):
+        self.set(key, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
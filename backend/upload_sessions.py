@@ -0,0 +1,156 @@
+"""
+Direct-to-storage image uploads for Lost & Found items.
+
+Clients request an upload session, PUT the image bytes straight to the
+signed storage URL, and then submit the item with the returned object key.
+The API workers never handle the image bytes on the request path; moving the
+upload under ``items/{item_id}/``, the vision description and the thumbnail
+are produced afterwards by ``ImagePostProcessor``.
+
+The processor's queue lives in worker memory. Items record the upload they
+are waiting on, so a periodic recovery pass re-enqueues jobs that a restart
+dropped, and a job that fails marks its item as failed.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AbstractSet, Awaitable, Callable, List, Optional, Set, Tuple
+
+from startup import lazy_import
+
+UPLOAD_SESSION_TTL_SECONDS = int(os.environ.get('UPLOAD_SESSION_TTL_SECONDS', '900'))
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+ALLOWED_IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif', 'image/heic')
+UPLOAD_PREFIX = 'uploads/'
+
+THUMBNAIL_SIZE = (320, 320)
+
+# A job still pending after this long is assumed lost and enqueued again
+IMAGE_JOB_STALE_SECONDS = int(os.environ.get('IMAGE_JOB_STALE_SECONDS', '600'))
+IMAGE_RECOVERY_INTERVAL_SECONDS = int(os.environ.get('IMAGE_RECOVERY_INTERVAL_SECONDS', '300'))
+
+_UNSAFE_FILENAME_RE = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def safe_filename(filename: str) -> str:
+    name = _UNSAFE_FILENAME_RE.sub('_', filename.rsplit('/', 1)[-1]).strip('._')
+    return name or 'image'
+
+
+def create_upload_session(bucket, filename: str, content_type: str) -> dict:
+    """Issue a signed URL the client can PUT an image to"""
+    if content_type not in ALLOWED_IMAGE_TYPES:
+        raise ValueError(f"Unsupported image type: {content_type}")
+
+    upload_id = str(uuid.uuid4())
+    object_key = f"{UPLOAD_PREFIX}{upload_id}/{safe_filename(filename)}"
+    expiration = timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+    headers = {
+        'Content-Type': content_type,
+        'x-goog-content-length-range': f"0,{MAX_UPLOAD_BYTES}",
+    }
+    upload_url = bucket.blob(object_key).generate_signed_url(
+        version='v4',
+        expiration=expiration,
+        method='PUT',
+        content_type=content_type,
+        headers={'x-goog-content-length-range': headers['x-goog-content-length-range']},
+    )
+    return {
+        'upload_id': upload_id,
+        'object_key': object_key,
+        'upload_url': upload_url,
+        'method': 'PUT',
+        'headers': headers,
+        'expires_at': (datetime.now(timezone.utc) + expiration).isoformat(),
+        'max_bytes': MAX_UPLOAD_BYTES,
+    }
+
+
+def is_upload_key(object_key: str) -> bool:
+    return object_key.startswith(UPLOAD_PREFIX) and '..' not in object_key
+
+
+def make_thumbnail(content: bytes) -> bytes:
+    """Downscale an image to a JPEG thumbnail"""
+    Image = lazy_import('PIL.Image')
+    with Image.open(io.BytesIO(content)) as image:
+        image = image.convert('RGB')
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=80)
+    return output.getvalue()
+
+
+class ImagePostProcessor:
+    """Queue and background worker for post-processing uploaded images"""
+
+    def __init__(
+        self,
+        process: Callable[[str, str], Awaitable[None]],
+        on_failure: Optional[Callable[[str, str], Awaitable[None]]] = None,
+    ):
+        self.process = process
+        self.on_failure = on_failure
+        self._queue: Optional[asyncio.Queue] = None
+        # Items queued or being processed by this worker
+        self.pending: Set[str] = set()
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def enqueue(self, item_id: str, object_key: str):
+        self.pending.add(item_id)
+        self.queue.put_nowait((item_id, object_key))
+
+    async def run_worker(self):
+        """Process queued uploads until cancelled"""
+        while True:
+            job: Tuple[str, str] = await self.queue.get()
+            item_id, object_key = job
+            try:
+                await self.process(item_id, object_key)
+            except Exception as e:
+                logging.error(f"Error processing upload {object_key} for item {item_id}: {str(e)}")
+                await self._record_failure(item_id, object_key)
+            finally:
+                self.pending.discard(item_id)
+                self.queue.task_done()
+
+    async def _record_failure(self, item_id: str, object_key: str):
+        if self.on_failure is None:
+            return
+        try:
+            await self.on_failure(item_id, object_key)
+        except Exception as e:
+            logging.error(f"Error marking upload {object_key} of item {item_id} as failed: {str(e)}")
+
+    async def run_recovery(
+        self,
+        claim_stale_jobs: Callable[[AbstractSet[str]], List[Tuple[str, str]]],
+        interval: int = IMAGE_RECOVERY_INTERVAL_SECONDS,
+    ):
+        """Re-enqueue jobs lost from memory, at startup and then on a fixed interval.
+
+        ``claim_stale_jobs`` gets the items this worker already has queued and
+        must skip them.
+        """
+        while True:
+            try:
+                jobs = await asyncio.to_thread(claim_stale_jobs, frozenset(self.pending))
+                for item_id, object_key in jobs:
+                    if item_id not in self.pending:
+                        self.enqueue(item_id, object_key)
+                if jobs:
+                    logging.info(f"Re-enqueued {len(jobs)} stale image jobs")
+            except Exception as e:
+                logging.error(f"Image job recovery failed: {str(e)}")
+            await asyncio.sleep(interval)
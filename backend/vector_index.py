@@ -0,0 +1,152 @@
+"""
+Compact description vectors for Lost & Found items.
+
+The Gemini image description is turned once at ingest into a fixed-dimension
+vector, stored on the item as base64-packed float16 together with the name
+of the model that produced it. All active vectors are held in an in-memory
+NumPy matrix so similarity against the whole set is one matrix multiply.
+
+The current model, ``hash-ngram-v1``, feature-hashes the words and character
+n-grams of the description, so it measures how close two descriptions are
+in wording, not in pixels. A learned embedding model can replace it by
+bumping ``VECTOR_MODEL``; vectors from other models are ignored until the
+items are re-embedded.
+"""
+
+import base64
+import heapq
+import math
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from lexical_scorer import char_ngrams
+from search_index import tokenize
+
+VECTOR_MODEL = "hash-ngram-v1"
+VECTOR_DIM = 256
+VECTOR_DTYPE = np.float16
+
+
+def embed_text(text: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """Feature-hash text into an L2-normalized vector"""
+    counts: Dict[int, float] = {}
+    for feature in tokenize(text) + char_ngrams(text):
+        digest = zlib.crc32(feature.encode('utf-8'))
+        index = digest % dim
+        sign = 1.0 if (digest >> 31) & 1 else -1.0
+        counts[index] = counts.get(index, 0.0) + sign
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for index, count in counts.items():
+        # Sublinear term frequency keeps long descriptions from dominating
+        vector[index] = math.copysign(1.0 + math.log(abs(count)), count) if count else 0.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def pack_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(VECTOR_DTYPE).tobytes()).decode('ascii')
+
+
+def unpack_vector(packed: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(packed), dtype=VECTOR_DTYPE).astype(np.float32)
+
+
+def encode_description_vector(description: str) -> dict:
+    """Item fields holding the packed vector of an image description"""
+    return {
+        'description_vector': pack_vector(embed_text(description)),
+        'description_vector_model': VECTOR_MODEL,
+    }
+
+
+def top_k(similarities: Dict[str, float], k: int, min_similarity: float = 0.0) -> List[Tuple[str, float]]:
+    """The k most similar items at or above a minimum similarity, best first"""
+    ranked = heapq.nlargest(k, similarities.items(), key=lambda pair: pair[1])
+    return [(item_id, score) for item_id, score in ranked if score >= min_similarity]
+
+
+def item_vector(item: dict) -> Optional[np.ndarray]:
+    """Decode the stored vector of an item if it came from the current model"""
+    packed = item.get('description_vector')
+    if not packed or item.get('description_vector_model') != VECTOR_MODEL:
+        return None
+    vector = unpack_vector(packed)
+    return vector if vector.shape == (VECTOR_DIM,) else None
+
+
+class VectorIndex:
+    """In-memory matrix of active item vectors for cosine similarity"""
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+        self._matrix = np.zeros((64, dim), dtype=np.float32)
+        self._ids: List[str] = []
+        self._types: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def load(self, items_collection):
+        """Rebuild the matrix from all active items in the collection"""
+        self._ids.clear()
+        self._types.clear()
+        self._positions.clear()
+        for doc in items_collection.where('status', '==', 'active').stream():
+            item = doc.to_dict()
+            if item and item.get('status') == 'active':
+                self.add(item)
+        self.loaded = True
+
+    def ensure_loaded(self, items_collection):
+        if not self.loaded:
+            self.load(items_collection)
+
+    def add(self, item: dict):
+        if item.get('status') != 'active':
+            self.remove(item['id'])
+            return
+        vector = item_vector(item)
+        if vector is None:
+            return
+        position = self._positions.get(item['id'])
+        if position is None:
+            position = len(self._ids)
+            if position == len(self._matrix):
+                grown = np.zeros((len(self._matrix) * 2, self.dim), dtype=np.float32)
+                grown[:position] = self._matrix[:position]
+                self._matrix = grown
+            self._ids.append(item['id'])
+            self._types.append(item.get('type'))
+            self._positions[item['id']] = position
+        self._matrix[position] = vector
+
+    def remove(self, item_id: str) -> bool:
+        position = self._positions.pop(item_id, None)
+        if position is None:
+            return False
+        # Move the last row into the freed slot
+        last = len(self._ids) - 1
+        if position != last:
+            self._matrix[position] = self._matrix[last]
+            self._ids[position] = self._ids[last]
+            self._types[position] = self._types[last]
+            self._positions[self._ids[position]] = position
+        self._ids.pop()
+        self._types.pop()
+        return True
+
+    def similarities(self, vector: np.ndarray, type: Optional[str] = None) -> Dict[str, float]:
+        """Cosine similarity of a vector against every indexed item"""
+        if not self._ids:
+            return {}
+        scores = self._matrix[:len(self._ids)] @ vector
+        return {
+            item_id: float(score)
+            for item_id, item_type, score in zip(self._ids, self._types, scores)
+            if type is None or item_type == type
+        }
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from read_through_cache import MemoryCacheBackend, ReadThroughCache
+from ttl_cache import TTLCache
+
+
+class Loader:
+    """Loader that counts calls and waits until released"""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.value
+
+
+def test_ttl_cache_evicts_and_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache('test', maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    now[0] += 11
+    assert cache.get('a') == (False, None)
+
+
+def test_ttl_cache_coalesces_concurrent_misses():
+    async def main():
+        cache = TTLCache('test', maxsize=10, ttl=60)
+        loader = Loader('value')
+        waiters = [asyncio.ensure_future(cache.get_or_load('key', loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        results = await asyncio.gather(*waiters)
+        return loader.calls, results, cache.get('key')
+
+    calls, results, cached = asyncio.run(main())
+    assert calls == 1
+    assert results == ['value'] * 3
+    assert cached == (True, 'value')
+
+
+def test_ttl_cache_does_not_store_load_invalidated_in_flight():
+    async def main():
+        cache = TTLCache('test', maxsize=10, ttl=60)
+        stale = Loader('stale')
+        waiter = asyncio.ensure_future(cache.get_or_load('key', stale))
+        await asyncio.sleep(0)
+        cache.invalidate('key')
+        stale.release.set()
+        old = await waiter
+        return old, cache.get('key')
+
+    old, cached = asyncio.run(main())
+    assert old == 'stale'
+    assert cached == (False, None)
+
+
+def test_read_through_cache_does_not_store_load_invalidated_in_flight():
+    async def main():
+        cache = ReadThroughCache(MemoryCacheBackend('test', maxsize=10, ttl=60))
+        stale = Loader('stale')
+        waiter = asyncio.ensure_future(cache.get_or_load('key', stale))
+        await asyncio.sleep(0)
+        await cache.invalidate('key')
+
+        # A read after the invalidation starts a fresh load instead of joining the stale one
+        fresh = Loader('fresh')
+        reader = asyncio.ensure_future(cache.get_or_load('key', fresh))
+        await asyncio.sleep(0)
+        stale.release.set()
+        fresh.release.set()
+        return await waiter, await reader, await cache.get_or_load('key', Loader('unused'))
+
+    old, new, cached = asyncio.run(main())
+    assert (old, new, cached) == ('stale', 'fresh', 'fresh')
+
+
+def test_read_through_cache_does_not_store_none():
+    async def main():
+        cache = ReadThroughCache(MemoryCacheBackend('test', maxsize=10, ttl=60))
+        missing = Loader(None)
+        missing.release.set()
+        await cache.get_or_load('key', missing)
+        await cache.get_or_load('key', missing)
+        return missing.calls
+
+    assert asyncio.run(main()) == 2
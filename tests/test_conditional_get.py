@@ -0,0 +1,41 @@
+import pytest
+from starlette.requests import Request
+
+from conditional_get import etag_matches, make_etag, with_version_bump
+
+
+def request_with(if_none_match=None):
+    headers = []
+    if if_none_match is not None:
+        headers.append((b'if-none-match', if_none_match.encode('latin-1')))
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'', 'headers': headers})
+
+
+ETAG = make_etag('listing', 'abc', 3)
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, False),
+    ('', False),
+    (ETAG, True),
+    ('*', True),
+    (f'W/{ETAG}', True),
+    (f'"other", {ETAG}', True),
+    ('"other"', False),
+    (ETAG.strip('"'), False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(request_with(header), ETAG) is expected
+
+
+def test_etags_depend_on_every_part():
+    assert make_etag('listing', 'abc', 3) == ETAG
+    assert make_etag('listing', 'abc', 4) != ETAG
+    assert make_etag('reviews', 'abc', 3) != ETAG
+
+
+def test_version_bump_keeps_other_increments():
+    update = with_version_bump({'$inc': {'ratingCount': 1}, '$set': {'title': 't'}})
+
+    assert update == {'$inc': {'ratingCount': 1, 'version': 1}, '$set': {'title': 't'}}
+    assert with_version_bump() == {'$inc': {'version': 1}}
@@ -0,0 +1,50 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from firebase_config import MockFirestore, MockStorageBucket
+from item_cleanup import ItemCleanupPipeline
+
+
+def put_blob(bucket, name, age_seconds=0):
+    blob = bucket.blob(name)
+    blob.upload_from_string(b'image')
+    created = (datetime.now(timezone.utc) - timedelta(seconds=age_seconds)).timestamp()
+    os.utime(blob._file, (created, created))
+    return blob
+
+
+def names(bucket):
+    return sorted(blob.name for blob in bucket.list_blobs())
+
+
+def test_sweep_removes_expired_unclaimed_uploads(tmp_path):
+    db = MockFirestore()
+    bucket = MockStorageBucket(tmp_path)
+    pipeline = ItemCleanupPipeline(db, bucket, upload_retention=3600)
+    put_blob(bucket, 'uploads/fresh/a.jpg', age_seconds=60)
+    put_blob(bucket, 'uploads/stale/b.jpg', age_seconds=7200)
+    put_blob(bucket, 'uploads/claimed/c.jpg', age_seconds=7200)
+    db.collection('items').document('item').set({
+        'id': 'item', 'image_key': 'uploads/claimed/c.jpg', 'image_status': 'processing',
+    })
+    put_blob(bucket, 'uploads/done/d.jpg', age_seconds=7200)
+    db.collection('items').document('done').set({
+        'id': 'done', 'image_key': 'uploads/done/d.jpg', 'image_status': 'ready',
+    })
+
+    report = pipeline.sweep()
+
+    assert report['uploads_deleted'] == 2
+    assert names(bucket) == ['uploads/claimed/c.jpg', 'uploads/fresh/a.jpg']
+
+
+def test_sweep_removes_blobs_of_deleted_items(tmp_path):
+    db = MockFirestore()
+    bucket = MockStorageBucket(tmp_path)
+    pipeline = ItemCleanupPipeline(db, bucket)
+    db.collection('items').document('kept').set({'id': 'kept'})
+    put_blob(bucket, 'items/kept/image.jpg')
+    put_blob(bucket, 'items/gone/image.jpg')
+
+    assert pipeline.sweep()['blobs_deleted'] == 1
+    assert names(bucket) == ['items/kept/image.jpg']
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from firebase_config import MockFirestore, MockQuery
+from item_lifecycle import ItemLifecycleManager
+
+
+@pytest.fixture
+def match_reads(monkeypatch):
+    """Match documents returned by Firestore queries"""
+    reads = []
+    original = MockQuery.stream
+
+    def stream(query):
+        docs = original(query)
+        if query.name == 'matches':
+            reads.extend(docs)
+        return docs
+    monkeypatch.setattr(MockQuery, 'stream', stream)
+    return reads
+
+
+def add_item(db, item_id, created_at=None, status='active'):
+    created_at = created_at or datetime.now(timezone.utc)
+    db.collection('items').document(item_id).set({
+        'id': item_id, 'status': status, 'created_at': created_at.isoformat(),
+    })
+
+
+def add_match(db, match_id, lost_id, found_id, confirmed=True):
+    db.collection('matches').document(match_id).set({
+        'id': match_id, 'lost_item_id': lost_id, 'found_item_id': found_id,
+        'confirmed': confirmed, 'archived': False,
+    })
+
+
+def test_confirmed_matches_are_processed_once(match_reads):
+    db = MockFirestore()
+    for item_id in ('lost', 'found', 'other'):
+        add_item(db, item_id)
+    add_match(db, 'm1', 'lost', 'found')
+    add_match(db, 'm2', 'other', 'found', confirmed=False)
+    manager = ItemLifecycleManager(db)
+
+    report = manager.run_once()
+    assert sorted(report['archived_ids']) == ['found', 'lost']
+    assert db.collection('items').document('other').get().to_dict()['status'] == 'active'
+    assert db.collection('matches').document('m1').get().to_dict()['archived'] is True
+    assert len(match_reads) == 1
+
+    # Nothing new was confirmed, so the next run reads no matches at all
+    assert manager.run_once()['archived_matched'] == 0
+    assert len(match_reads) == 1
+
+
+def test_stale_items_are_archived():
+    db = MockFirestore()
+    add_item(db, 'old', created_at=datetime.now(timezone.utc) - timedelta(days=200))
+    add_item(db, 'new')
+    report = ItemLifecycleManager(db, archive_after_days=90).run_once()
+    assert report['archived_ids'] == ['old']
+    assert db.collection('items').document('old').get().to_dict()['archive_reason'] == 'stale'
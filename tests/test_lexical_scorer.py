@@ -0,0 +1,63 @@
+from lexical_scorer import (
+    CALIBRATION_POINTS, MAX_PROFILE_TERMS, PROFILE_VERSION, LexicalCorpus, build_lexical_profile,
+    calibrate, char_ngrams, get_lexical_profile, lexical_score,
+)
+
+
+def make_item(item_id, title, description, category="Electronics", location="Central Station"):
+    return {
+        "id": item_id,
+        "title": title,
+        "category": category,
+        "description": description,
+        "location": location,
+    }
+
+
+def test_char_ngrams_are_word_bounded():
+    grams = char_ngrams("Red bag")
+    assert " re" in grams and "ed " in grams
+    assert "d b" not in grams
+
+
+def test_calibrate_hits_anchor_points_and_clamps():
+    for similarity, score in CALIBRATION_POINTS:
+        assert calibrate(similarity) == score
+    assert calibrate(-1.0) == 0.0
+    assert calibrate(2.0) == 100.0
+    samples = [calibrate(x / 100) for x in range(101)]
+    assert samples == sorted(samples)
+
+
+def test_profile_is_truncated_to_heaviest_terms():
+    words = " ".join(f"word{i}" for i in range(500))
+    profile = build_lexical_profile({"title": words})
+    assert profile["version"] == PROFILE_VERSION
+    assert len(profile["terms"]) == MAX_PROFILE_TERMS
+    # Length covers every term, not just the kept ones
+    assert profile["length"] > sum(profile["terms"].values())
+
+
+def test_stale_profile_is_rebuilt():
+    item = make_item("a", "Black wallet", "leather")
+    item["lexical_profile"] = {"version": PROFILE_VERSION - 1, "length": 1.0, "terms": {"zzz": 1.0}}
+    assert get_lexical_profile(item) == build_lexical_profile(item)
+
+
+def test_identical_items_score_full_marks():
+    item = make_item("a", "Black leather wallet", "Worn wallet with a zip pocket")
+    assert lexical_score(item, dict(item, id="b")) == 100.0
+
+
+def test_rank_orders_filters_and_truncates():
+    query = make_item("q", "Blue Samsung phone", "Cracked screen, blue case")
+    close = make_item("c", "Samsung phone in blue case", "Screen is cracked")
+    far = make_item("f", "Umbrella", "Green folding umbrella", category="Accessories", location="Park")
+    corpus = LexicalCorpus.from_items([query, close, far])
+
+    ranked = corpus.rank(query, [far, close])
+    assert [item["id"] for item, _ in ranked] == ["c", "f"]
+    assert ranked[0][1] > ranked[1][1]
+
+    assert len(corpus.rank(query, [far, close], top_k=1)) == 1
+    assert [item["id"] for item, _ in corpus.rank(query, [far, close], min_score=ranked[0][1])] == ["c"]
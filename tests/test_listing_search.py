@@ -0,0 +1,58 @@
+import mongomock
+
+from listing_search import PRICE_BUCKETS, facet_counts, facet_pipeline
+
+
+def run_facets(listings, field_filters=None):
+    collection = mongomock.MongoClient().db.listings
+    collection.insert_many(listings)
+    result = list(collection.aggregate(facet_pipeline({}, field_filters or {})))
+    return facet_counts(result[0] if result else None)
+
+
+def price_counts(facets):
+    return {bucket['min']: bucket['count'] for bucket in facets['price']}
+
+
+def listing(price, **fields):
+    return {'type': 'apartment', 'status': 'available', 'bedrooms': 1, 'price': price, **fields}
+
+
+def test_prices_fall_in_their_buckets():
+    facets = run_facets([listing(100), listing(5000), listing(9999), listing(75000)])
+
+    counts = price_counts(facets)
+    assert counts[0] == 1
+    assert counts[5000] == 2
+    assert counts[PRICE_BUCKETS[-1]] == 1
+    assert facets['total'] == 4
+
+
+def test_invalid_prices_stay_out_of_the_open_bucket():
+    listings = [listing(None), listing(-5), listing('700'), listing(60000)]
+    listings.append({'type': 'room', 'status': 'available', 'bedrooms': 2})
+
+    facets = run_facets(listings)
+
+    assert sum(price_counts(facets).values()) == 1
+    assert price_counts(facets)[PRICE_BUCKETS[-1]] == 1
+    assert facets['total'] == 5
+
+
+def test_each_facet_ignores_its_own_filter():
+    listings = [listing(100, type='apartment'), listing(100, type='room'), listing(6000, type='room')]
+
+    facets = run_facets(listings, {'type': 'room'})
+
+    assert {group['value']: group['count'] for group in facets['type']} == {'apartment': 1, 'room': 2}
+    assert price_counts(facets)[0] == 1
+    assert price_counts(facets)[5000] == 1
+    assert facets['total'] == 2
+
+
+def test_empty_result_lists_every_bucket():
+    facets = facet_counts(None)
+
+    assert len(facets['price']) == len(PRICE_BUCKETS)
+    assert facets['price'][-1] == {'min': PRICE_BUCKETS[-1], 'max': None, 'count': 0}
+    assert facets['total'] == 0
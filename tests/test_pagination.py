@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+from pagination import (
+    InvalidCursor, clamp_limit, decode_cursor, decode_keyset_cursor, encode_cursor,
+    encode_keyset_cursor, keyset_filter, keyset_sort,
+)
+
+
+def test_cursor_round_trips_dates_and_ids():
+    created = datetime(2026, 10, 1, 12, 30, tzinfo=timezone.utc)
+    doc = {'_id': ObjectId(), 'updatedAt': created}
+
+    cursor = encode_keyset_cursor('inbox', 'updatedAt', doc)
+
+    assert '=' not in cursor
+    assert decode_keyset_cursor(cursor, 'inbox') == (created, doc['_id'])
+
+
+def test_cursor_is_tied_to_its_sort_order():
+    cursor = encode_cursor('newest', 5)
+
+    assert decode_cursor(cursor, 'newest')['v'] == 5
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 'oldest')
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', 'e30', encode_cursor('inbox', 1)])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_keyset_cursor(cursor, 'inbox')
+
+
+def test_clamp_limit():
+    assert clamp_limit(0, 50) == 1
+    assert clamp_limit(20, 50) == 20
+    assert clamp_limit(500, 50) == 50
+
+
+@pytest.mark.parametrize('direction', [1, -1])
+def test_keyset_pages_cover_ties_exactly_once(direction):
+    collection = mongomock.MongoClient().db.items
+    collection.insert_many([{'rank': rank} for rank in (1, 2, 2, 2, 3, 3, 4)])
+
+    seen = []
+    query = {}
+    while True:
+        page = list(collection.find(query).sort(keyset_sort('rank', direction)).limit(2))
+        if not page:
+            break
+        seen.extend(page)
+        value, last_id = decode_keyset_cursor(encode_keyset_cursor('rank', 'rank', page[-1]), 'rank')
+        query = keyset_filter('rank', direction, value, last_id)
+
+    assert len({doc['_id'] for doc in seen}) == 7
+    assert [doc['rank'] for doc in seen] == sorted((doc['rank'] for doc in seen), reverse=direction == -1)
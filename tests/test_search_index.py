@@ -0,0 +1,102 @@
+import time
+from datetime import date
+
+import pytest
+
+from firebase_config import MockFirestore
+from search_index import ItemSearchIndex, parse_item_date, parse_query_date, tokenize
+
+
+def make_item(item_id, title, type="lost", category="Bags", date="2026-03-10", description=""):
+    return {
+        "id": item_id,
+        "title": title,
+        "type": type,
+        "category": category,
+        "description": description,
+        "location": "Library",
+        "date": date,
+        "status": "active",
+    }
+
+
+def test_tokenize_drops_stop_words():
+    assert tokenize("The red bag, left at the station") == ["red", "bag", "left", "station"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2026-03-10", date(2026, 3, 10)),
+    ("2026-03-10T18:30:00+00:00", date(2026, 3, 10)),
+    ("10 March 2026", date(2026, 3, 10)),
+    ("Mar 10, 2026", date(2026, 3, 10)),
+    ("03/10/2026", None),
+    ("last tuesday", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_item_date(value, expected):
+    assert parse_item_date(value) == expected
+
+
+def test_parse_query_date_requires_iso():
+    assert parse_query_date("2026-03-10") == date(2026, 3, 10)
+    assert parse_query_date(None) is None
+    with pytest.raises(ValueError):
+        parse_query_date("10/03/2026")
+
+
+def test_search_ranks_and_filters():
+    index = ItemSearchIndex()
+    index.add(make_item("a", "Red backpack", date="2026-03-01"))
+    index.add(make_item("b", "Red backpack with straps", date="10 March 2026"))
+    index.add(make_item("c", "Red umbrella", type="found", category="Umbrellas", date="yesterday"))
+
+    ranked = index.search("red backpack")
+    assert {item_id for item_id, _ in ranked[:2]} == {"a", "b"}
+    assert ranked[-1][0] == "c"
+    assert [item_id for item_id, _ in index.search("red", type="found")] == ["c"]
+    assert [item_id for item_id, _ in index.search("red", category="umbrellas")] == ["c"]
+
+    # Dates compare as dates, not strings, and unparseable dates never match a range
+    in_range = index.search("red", date_from=date(2026, 3, 5), date_to=date(2026, 3, 31))
+    assert [item_id for item_id, _ in in_range] == ["b"]
+    assert "c" not in {item_id for item_id, _ in index.search("red", date_to=date(2030, 1, 1))}
+
+
+def test_add_replaces_and_remove_cleans_postings():
+    index = ItemSearchIndex()
+    index.add(make_item("a", "Blue wallet"))
+    index.add(make_item("a", "Green scarf"))
+    assert len(index) == 1
+    assert index.search("wallet") == []
+    assert index.remove("a") is True
+    assert index.remove("a") is False
+    assert index.search("scarf") == []
+
+
+def test_inactive_items_are_not_indexed():
+    index = ItemSearchIndex()
+    index.add(make_item("a", "Blue wallet"))
+    index.add({**make_item("a", "Blue wallet"), "status": "archived"})
+    index.add({**make_item("b", "Blue wallet"), "status": "archived"})
+
+    assert len(index) == 0
+
+
+def test_index_reloads_once_stale(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    db = MockFirestore()
+    items = db.collection("items")
+    items.document("a").set(make_item("a", "Blue wallet"))
+    index = ItemSearchIndex(max_age=60)
+    index.ensure_loaded(items)
+
+    # Written by another worker, so this index never saw the add
+    items.document("b").set(make_item("b", "Blue scarf"))
+    index.ensure_loaded(items)
+    assert "b" not in index
+
+    now[0] += 61
+    index.ensure_loaded(items)
+    assert "b" in index
@@ -0,0 +1,77 @@
+import asyncio
+
+from upload_sessions import ImagePostProcessor
+
+
+def run_jobs(processor, jobs):
+    async def main():
+        worker = asyncio.create_task(processor.run_worker())
+        for job in jobs:
+            processor.enqueue(*job)
+        await processor.queue.join()
+        worker.cancel()
+    asyncio.run(main())
+
+
+def test_failed_jobs_are_reported():
+    processed, failed = [], []
+
+    async def process(item_id, object_key):
+        if item_id == 'bad':
+            raise RuntimeError('download failed')
+        processed.append(item_id)
+
+    async def on_failure(item_id, object_key):
+        failed.append((item_id, object_key))
+
+    run_jobs(ImagePostProcessor(process, on_failure=on_failure), [('bad', 'uploads/1/a.jpg'), ('good', 'uploads/2/b.jpg')])
+
+    assert processed == ['good']
+    assert failed == [('bad', 'uploads/1/a.jpg')]
+
+
+def test_recovery_enqueues_claimed_jobs():
+    processed = []
+
+    async def process(item_id, object_key):
+        processed.append(item_id)
+
+    processor = ImagePostProcessor(process)
+
+    async def main():
+        worker = asyncio.create_task(processor.run_worker())
+        recovery = asyncio.create_task(processor.run_recovery(lambda skip: [('stale', 'uploads/1/a.jpg')], interval=3600))
+        await asyncio.sleep(0.05)
+        await processor.queue.join()
+        worker.cancel()
+        recovery.cancel()
+    asyncio.run(main())
+
+    assert processed == ['stale']
+
+
+def test_recovery_skips_jobs_already_queued_here():
+    processed, skipped = [], []
+
+    async def process(item_id, object_key):
+        processed.append(item_id)
+
+    def claim(skip):
+        skipped.append(set(skip))
+        return [('queued', 'uploads/1/a.jpg')]
+
+    processor = ImagePostProcessor(process)
+
+    async def main():
+        processor.enqueue('queued', 'uploads/1/a.jpg')
+        recovery = asyncio.create_task(processor.run_recovery(claim, interval=3600))
+        await asyncio.sleep(0.05)
+        worker = asyncio.create_task(processor.run_worker())
+        await processor.queue.join()
+        worker.cancel()
+        recovery.cancel()
+    asyncio.run(main())
+
+    assert skipped == [{'queued'}]
+    assert processed == ['queued']
+    assert processor.pending == set()
@@ -0,0 +1,23 @@
+from vector_index import VectorIndex, encode_description_vector, item_vector, top_k
+
+
+def test_top_k_orders_and_filters():
+    similarities = {'a': 0.2, 'b': 0.9, 'c': 0.6, 'd': 0.7}
+
+    assert top_k(similarities, 2) == [('b', 0.9), ('d', 0.7)]
+    assert top_k(similarities, 10, min_similarity=0.65) == [('b', 0.9), ('d', 0.7)]
+    assert top_k({}, 3) == []
+
+
+def test_similar_descriptions_rank_first():
+    index = VectorIndex()
+    items = {
+        'wallet': 'A black leather wallet with a silver zipper',
+        'umbrella': 'A long red umbrella with a wooden handle',
+    }
+    for item_id, description in items.items():
+        index.add({'id': item_id, 'type': 'lost', 'status': 'active', **encode_description_vector(description)})
+    query = item_vector(encode_description_vector('Black leather wallet, silver zip'))
+    similarities = index.similarities(query, type='lost')
+
+    assert top_k(similarities, 1)[0][0] == 'wallet'